@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import Counter
+
+# Lower values are admitted first
+PRIORITY_ACTIVE_CONVERSATION = 0
+PRIORITY_NEW_CONVERSATION = 1
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted"""
+    def __init__(self, reason):
+        super().__init__(f"Request shed: {reason}")
+        self.reason = reason
+
+def _decrement(counter, key):
+    """Decrement a counter entry, dropping it at zero so idle clients don't accumulate"""
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+class _Waiter:
+    def __init__(self, client_id, priority, seq):
+        self.client_id = client_id
+        self.priority = priority
+        self.seq = seq
+        self.granted = False
+        self.evicted = False
+
+class AdmissionController:
+    """Bounded-concurrency gate with a short, prioritized and per-client fair wait queue"""
+
+    def __init__(self, max_concurrent=4, max_queue=8, queue_timeout=2.0, max_per_client=2):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_client = max_per_client
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_client = Counter()
+        self._queued_by_client = Counter()
+        self._waiters = []
+        self._seq = 0
+
+        self._admitted = 0
+        self._queued_total = 0
+        self._shed = Counter()
+        self._peak_queue_depth = 0
+        self._waits = 0
+        self._total_wait = 0.0
+
+    def acquire(self, client_id, priority=PRIORITY_NEW_CONVERSATION):
+        """Block until a slot is free, or raise AdmissionRejected"""
+        with self._cond:
+            in_flight = self._active_by_client[client_id] + self._queued_by_client[client_id]
+            if in_flight >= self.max_per_client:
+                self._reject('client_limit')
+
+            if self._active < self.max_concurrent and not self._waiters:
+                self._grant(client_id)
+                return
+
+            if len(self._waiters) >= self.max_queue:
+                # Make room by evicting the newest waiter of the lowest
+                # priority, but only if it ranks below this request
+                victim = max(self._waiters, key=lambda w: (w.priority, w.seq))
+                if victim.priority <= priority:
+                    self._reject('queue_full')
+                self._waiters.remove(victim)
+                _decrement(self._queued_by_client, victim.client_id)
+                victim.evicted = True
+                self._cond.notify_all()
+
+            self._seq += 1
+            waiter = _Waiter(client_id, priority, self._seq)
+            self._waiters.append(waiter)
+            self._queued_by_client[client_id] += 1
+            self._queued_total += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, len(self._waiters))
+
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            while not waiter.granted:
+                if waiter.evicted:
+                    self._reject('evicted')
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(waiter)
+                    _decrement(self._queued_by_client, client_id)
+                    self._reject('timeout')
+                self._cond.wait(remaining)
+            self._waits += 1
+            self._total_wait += time.monotonic() - started
+
+    def release(self, client_id):
+        """Free a slot and hand it to the next waiter"""
+        with self._cond:
+            self._active -= 1
+            _decrement(self._active_by_client, client_id)
+            self._grant_waiters()
+
+    def stats(self):
+        """Return queue depth, concurrency and shed counters"""
+        with self._cond:
+            return {
+                "active": self._active,
+                "queue_depth": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self._admitted,
+                "queued": self._queued_total,
+                "peak_queue_depth": self._peak_queue_depth,
+                "avg_queue_wait_ms": round(self._total_wait * 1000 / self._waits, 2) if self._waits else 0.0,
+                "shed": dict(self._shed),
+                "shed_total": sum(self._shed.values())
+            }
+
+    def _grant(self, client_id):
+        self._active += 1
+        self._active_by_client[client_id] += 1
+        self._admitted += 1
+
+    def _grant_waiters(self):
+        """Admit waiters while slots are free: priority first, then least-served client, then FIFO"""
+        granted = False
+        while self._waiters and self._active < self.max_concurrent:
+            waiter = min(
+                self._waiters,
+                key=lambda w: (w.priority, self._active_by_client[w.client_id], w.seq)
+            )
+            self._waiters.remove(waiter)
+            _decrement(self._queued_by_client, waiter.client_id)
+            waiter.granted = True
+            self._grant(waiter.client_id)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _reject(self, reason):
+        self._shed[reason] += 1
+        raise AdmissionRejected(reason)
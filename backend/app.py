@@ -1,17 +1,38 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, send_file
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import threading
+import time
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
-from models import get_database_url, Conversation, Message, get_session, create_database_engine
+from models import get_database_url, Conversation, Message
+from db_routing import DatabaseRouter
+from conversation_archive import serialize_message, get_archive, unpack_messages, archived_message_counts
+from http_utils import OrjsonProvider, make_etag, parse_since, not_modified, with_validators, gzip_response
 from chat_service import ChatService
+import queries
+from traffic_capture import TrafficRecorder
+from profiling import ProfileStore
+from admission import (
+    AdmissionController, AdmissionRejected,
+    PRIORITY_ACTIVE_CONVERSATION, PRIORITY_NEW_CONVERSATION
+)
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+app.json = OrjsonProvider(app)
+
+# X-Forwarded-For is only trusted from this many reverse proxies in front of
+# the app; without one, any caller could spoof it to dodge per-client limits
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+app.after_request(gzip_response)
+CORS(app, expose_headers=['ETag', 'Last-Modified'])
 
 # Configure Flask-SQLAlchemy
 app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
@@ -21,14 +42,116 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 db = SQLAlchemy()
 db.init_app(app)
 
+# Shared engines so every request draws from pooled connections; read-only
+# work goes to replicas from DB_REPLICA_URLS when they are healthy and fresh
+router = DatabaseRouter.from_env()
+
 # Initialize chat service
 chat_service = ChatService()
 
+# Opt-in capture of anonymized /api/chat traffic for replay load tests
+traffic_recorder = TrafficRecorder.from_env()
+if traffic_recorder:
+    traffic_recorder.init_app(app)
+
+# On-demand sampling profiles of /api/chat (X-Profile-Token or PROFILE_SAMPLE_RATE)
+profiles = ProfileStore.from_env()
+
+# Bounded concurrency in front of the LLM and database for /api/chat
+admission = AdmissionController(
+    max_concurrent=int(os.getenv('CHAT_MAX_CONCURRENCY', 4)),
+    max_queue=int(os.getenv('CHAT_MAX_QUEUE', 8)),
+    queue_timeout=float(os.getenv('CHAT_QUEUE_TIMEOUT', 2.0)),
+    max_per_client=int(os.getenv('CHAT_MAX_PER_CLIENT', 2))
+)
+CHAT_RETRY_AFTER = os.getenv('CHAT_RETRY_AFTER', '2')
+
+# Readiness is tracked separately from liveness: a worker is alive as soon as
+# it starts, but only ready once its pool and caches have been warmed
+readiness = {"ready": False, "warmed_at": None, "checks": {}}
+WARM_UP_RETRY_INTERVAL = float(os.getenv('WARM_UP_RETRY_INTERVAL', 10))
+_warm_up_lock = threading.Lock()
+_last_warm_up_retry = 0.0
+
+def dispose_engines():
+    """Drop pooled connections inherited from the parent process after a fork"""
+    router.dispose()
+
+def client_id():
+    """Identify the calling client for per-client admission fairness"""
+    # ProxyFix rewrites remote_addr from X-Forwarded-For behind trusted proxies
+    return request.remote_addr
+
+def parse_location(value):
+    """Parse an optional {"latitude", "longitude"} object into a tuple, or raise ValueError"""
+    if value is None:
+        return None
+    try:
+        latitude, longitude = float(value['latitude']), float(value['longitude'])
+    except (KeyError, TypeError):
+        raise ValueError("location needs latitude and longitude")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("location out of range")
+    return latitude, longitude
+
+def client_last_write(since=None):
+    """Latest write the client knows about: X-Last-Write or its `since` cursor, as naive UTC"""
+    # The client echoes the timestamp of its last /api/chat response, which
+    # lets whichever worker serves the read honour read-your-writes
+    try:
+        header = parse_since(request.headers.get('X-Last-Write'))
+    except ValueError:
+        header = None
+    candidates = [value for value in (header, since) if value is not None]
+    return max(candidates) if candidates else None
+
+def warm_up():
+    """Open a pooled connection and warm the chat service caches"""
+    session = router.read_session()
+    try:
+        checks = {"database": "ok", "replicas": router.warm_up()}
+        checks.update(chat_service.warm_up(session))
+        readiness.update(ready=True, warmed_at=datetime.utcnow().isoformat(), checks=checks)
+    except Exception as e:
+        app.logger.error(f"Warm-up failed: {str(e)}")
+        readiness.update(ready=False, checks={"error": str(e)})
+    finally:
+        session.close()
+    return readiness["ready"]
+
+def retry_warm_up():
+    """Retry a failed warm-up on a background thread, at most once per WARM_UP_RETRY_INTERVAL"""
+    global _last_warm_up_retry
+    if time.monotonic() - _last_warm_up_retry < WARM_UP_RETRY_INTERVAL:
+        return
+    if not _warm_up_lock.acquire(blocking=False):
+        return  # a retry is already running
+    _last_warm_up_retry = time.monotonic()
+    
+    def run():
+        try:
+            warm_up()
+        finally:
+            _warm_up_lock.release()
+    threading.Thread(target=run, name='warm-up-retry', daemon=True).start()
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "timestamp": datetime.utcnow().isoformat()})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint; reports state and retries warm-up in the background until it succeeds"""
+    if not readiness["ready"]:
+        retry_warm_up()
+    status_code = 200 if readiness["ready"] else 503
+    return jsonify({
+        "status": "ready" if readiness["ready"] else "warming",
+        "warmed_at": readiness["warmed_at"],
+        "checks": readiness["checks"]
+    }), status_code
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
@@ -36,7 +159,8 @@ def chat():
     Expected payload:
     {
         "message": "User's message",
-        "conversation_id": "optional_conversation_id"
+        "conversation_id": "optional_conversation_id",
+        "location": {"latitude": 41.88, "longitude": -87.63}  (optional)
     }
     """
     try:
@@ -47,88 +171,218 @@ def chat():
         
         user_message = data['message']
         conversation_id = data.get('conversation_id')
+        try:
+            location = parse_location(data.get('location'))
+        except ValueError:
+            return jsonify({"error": "Invalid location"}), 400
+        trace = g.get('traffic_trace')
         
-        # Get or create conversation
-        engine = create_database_engine()
-        session = get_session(engine)
-        
+        # Admit the request, or fall back to a cheap degraded answer when shedding
+        client = client_id()
+        priority = PRIORITY_ACTIVE_CONVERSATION if conversation_id else PRIORITY_NEW_CONVERSATION
         try:
-            if conversation_id:
-                conversation = session.query(Conversation).filter_by(session_id=conversation_id).first()
-                if not conversation:
-                    return jsonify({"error": "Conversation not found"}), 404
-            else:
-                # Create new conversation
-                conversation_id = str(uuid.uuid4())
-                conversation = Conversation(session_id=conversation_id)
-                session.add(conversation)
-                session.flush()  # Get the ID
-            
-            # Save user message
-            user_msg = Message(
-                conversation_id=conversation.id,
-                message_type='user',
-                content=user_message,
-                timestamp=datetime.utcnow()
-            )
-            session.add(user_msg)
-            
-            # Generate AI response
-            ai_response = chat_service.generate_response(user_message, conversation_id, session)
-            
-            # Save AI response
-            ai_msg = Message(
-                conversation_id=conversation.id,
-                message_type='assistant',
-                content=ai_response,
-                timestamp=datetime.utcnow()
-            )
-            session.add(ai_msg)
-            
-            session.commit()
-            
+            admission.acquire(client, priority)
+        except AdmissionRejected as e:
+            degraded_response = chat_service.generate_degraded_response(user_message)
+            if trace is not None:
+                trace['degraded'] = True
+            if degraded_response is None:
+                response = jsonify({"error": "Service is busy, please retry shortly"})
+                response.headers['Retry-After'] = CHAT_RETRY_AFTER
+                return response, 503
+            # Not persisted: shedding exists to spare the database, and a
+            # canned answer adds nothing to the conversation worth keeping
             return jsonify({
-                "response": ai_response,
-                "conversation_id": conversation.session_id,
-                "timestamp": datetime.utcnow().isoformat()
+                "response": degraded_response,
+                "conversation_id": conversation_id,
+                "timestamp": datetime.utcnow().isoformat(),
+                "degraded": True
             })
+        
+        # Everything after a successful acquire releases the slot, including
+        # session and profiler setup
+        try:
+            # Get or create conversation
+            session = router.primary_session()
+            try:
+                read_session = router.read_session()
+            except Exception:
+                session.close()
+                raise
             
-        except Exception as e:
-            session.rollback()
-            raise e
+            # Profile response generation and persistence when the request opted in
+            try:
+                profile = profiles.start(request.headers)
+            except Exception:
+                session.close()
+                read_session.close()
+                raise
+            if profile and trace is None:
+                trace = {}
+            status_code = 500
+            
+            try:
+                if conversation_id:
+                    conversation = session.scalars(queries.conversation_by_session(conversation_id)).first()
+                    if not conversation:
+                        status_code = 404
+                        return jsonify({"error": "Conversation not found"}), 404
+                    # Keeps conversation list validators and `since` deltas accurate
+                    conversation.updated_at = datetime.utcnow()
+                else:
+                    # Create new conversation
+                    conversation_id = str(uuid.uuid4())
+                    conversation = Conversation(session_id=conversation_id)
+                    session.add(conversation)
+                    session.flush()  # Get the ID
+                
+                # Save user message
+                user_msg = Message(
+                    conversation_id=conversation.id,
+                    message_type='user',
+                    content=user_message,
+                    timestamp=datetime.utcnow()
+                )
+                session.add(user_msg)
+                
+                # Generate AI response
+                ai_response = chat_service.generate_response(
+                    user_message, conversation_id, session, read_session, trace,
+                    location=location, user_id=conversation.user_id
+                )
+                
+                # Save AI response
+                ai_msg = Message(
+                    conversation_id=conversation.id,
+                    message_type='assistant',
+                    content=ai_response,
+                    timestamp=datetime.utcnow()
+                )
+                session.add(ai_msg)
+                
+                session.commit()
+                router.record_write(conversation.session_id)
+                status_code = 200
+                
+                return jsonify({
+                    "response": ai_response,
+                    "conversation_id": conversation.session_id,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+                read_session.close()
+                if profile:
+                    try:
+                        analysis = trace.get('intent_analysis') or {}
+                        g.profile_id = profiles.finish(
+                            profile,
+                            endpoint='/api/chat',
+                            status=status_code,
+                            intent=analysis.get('intent'),
+                            classified_by=trace.get('classified_by'),
+                            message_length=len(user_message)
+                        )
+                    except Exception as e:
+                        # A failed profile write must not turn a good answer into a 500
+                        app.logger.warning(f"Could not save request profile: {str(e)}")
         finally:
-            session.close()
+            admission.release(client)
             
     except Exception as e:
         app.logger.error(f"Error in chat endpoint: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.after_request
+def add_profile_header(response):
+    """Tell an opted-in caller which stored profile covers its request"""
+    profile_id = g.pop('profile_id', None)
+    if profile_id:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List recently stored request profiles (requires X-Profile-Token)"""
+    if not profiles.authorized(request.headers):
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"profiles": profiles.recent(), "skipped": profiles.skipped})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a profile as collapsed stacks for flamegraph.pl or speedscope"""
+    if not profiles.authorized(request.headers):
+        return jsonify({"error": "Not found"}), 404
+    path = profiles.folded_path(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f"{profile_id}.folded")
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Admission, routing and request coalescing counters for this worker"""
+    return jsonify({
+        "pid": os.getpid(),
+        "admission": admission.stats(),
+        "routing": router.stats(),
+        "coalescing": chat_service.coalescing_stats()
+    })
+
 @app.route('/api/conversations/<conversation_id>/history', methods=['GET'])
 def get_conversation_history(conversation_id):
-    """Get conversation history"""
+    """Get conversation history, or only messages newer than ?since=<timestamp>"""
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({"error": "Invalid 'since' timestamp"}), 400
+    
     try:
-        engine = create_database_engine()
-        session = get_session(engine)
+        session = router.conversation_session(conversation_id, client_last_write(since))
         
         try:
-            conversation = session.query(Conversation).filter_by(session_id=conversation_id).first()
+            conversation = session.scalars(queries.conversation_by_session(conversation_id)).first()
+            if not conversation and not router.is_primary(session):
+                # Possibly not replicated yet; confirm on the primary
+                session.close()
+                session = router.primary_session()
+                conversation = session.scalars(queries.conversation_by_session(conversation_id)).first()
             if not conversation:
                 return jsonify({"error": "Conversation not found"}), 404
             
-            messages = session.query(Message).filter_by(conversation_id=conversation.id).order_by(Message.timestamp).all()
+            # Version the conversation cheaply before loading any messages
+            hot_count, hot_last_id, hot_last_at = session.execute(
+                queries.conversation_version(conversation.id)
+            ).one()
+            archive = get_archive(session, conversation.id)
+            archived_count = archive.message_count if archive else 0
+            archived_last_at = archive.last_message_at if archive else None
+            
+            # A delta is a different representation from the full history
+            etag = make_etag(conversation.id, hot_count, hot_last_id, archived_count, since)
+            last_modified = max(t for t in (conversation.created_at, hot_last_at, archived_last_at) if t)
+            if not_modified(etag, last_modified):
+                return with_validators(app.response_class(status=304), etag, last_modified)
+            
+            messages = session.scalars(queries.conversation_messages(conversation.id, since)).all()
             
+            # Archived (cold) messages always predate the hot ones
             history = []
+            if archive and (since is None or archived_last_at > since):
+                history = [msg for msg in unpack_messages(archive.payload)
+                           if since is None or parse_since(msg['timestamp']) > since]
             for msg in messages:
-                history.append({
-                    "type": msg.message_type,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat()
-                })
+                history.append(serialize_message(msg))
             
-            return jsonify({
+            response = jsonify({
                 "conversation_id": conversation_id,
-                "messages": history
+                "messages": history,
+                "delta": since is not None
             })
+            return with_validators(response, etag, last_modified)
             
         finally:
             session.close()
@@ -139,17 +393,30 @@ def get_conversation_history(conversation_id):
 
 @app.route('/api/conversations', methods=['GET'])
 def list_conversations():
-    """List all conversations (for admin/debugging)"""
+    """List all conversations (for admin/debugging), or only those changed after ?since=<timestamp>"""
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({"error": "Invalid 'since' timestamp"}), 400
+    
     try:
-        engine = create_database_engine()
-        session = get_session(engine)
+        session = router.conversation_session(last_write_at=client_last_write(since))
         
         try:
-            conversations = session.query(Conversation).order_by(Conversation.created_at.desc()).limit(50).all()
+            total, last_updated = session.execute(queries.conversation_list_version()).one()
+            etag = make_etag(total, last_updated, since)
+            if not_modified(etag, last_updated):
+                return with_validators(app.response_class(status=304), etag, last_updated)
+            
+            conversations = session.scalars(queries.conversation_list(since, 50)).all()
+            conversation_ids = [conv.id for conv in conversations]
+            
+            hot_counts = dict(session.execute(queries.message_counts(conversation_ids)).all())
+            archived_counts = archived_message_counts(session, conversation_ids)
             
             result = []
             for conv in conversations:
-                message_count = session.query(Message).filter_by(conversation_id=conv.id).count()
+                message_count = hot_counts.get(conv.id, 0) + archived_counts.get(conv.id, 0)
                 result.append({
                     "conversation_id": conv.session_id,
                     "created_at": conv.created_at.isoformat(),
@@ -157,7 +424,8 @@ def list_conversations():
                     "message_count": message_count
                 })
             
-            return jsonify({"conversations": result})
+            response = jsonify({"conversations": result, "delta": since is not None})
+            return with_validators(response, etag, last_updated)
             
         finally:
             session.close()
@@ -168,4 +436,6 @@ def list_conversations():
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    debug_mode = os.getenv('FLASK_ENV', 'development') == 'development'
+    warm_up()
+    app.run(host='0.0.0.0', port=port, debug=debug_mode)
@@ -0,0 +1,165 @@
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'archive'))
+STAGING_DIR = os.getenv('ARCHIVE_STAGING_DIR', os.path.join(ARCHIVE_DIR, 'parquet'))
+
+# Explicit column types for every archive table so conversion never has to
+# infer dtypes. 'datetime' columns are parsed once here and stored as
+# timestamps; 'category' columns are dictionary-encoded in Parquet.
+TABLE_SCHEMAS = {
+    'distribution_centers': {
+        'id': 'int32',
+        'name': 'string',
+        'latitude': 'float64',
+        'longitude': 'float64',
+    },
+    'users': {
+        'id': 'int32',
+        'first_name': 'string',
+        'last_name': 'string',
+        'email': 'string',
+        'age': 'Int16',
+        'gender': 'category',
+        'state': 'category',
+        'street_address': 'string',
+        'postal_code': 'string',
+        'city': 'category',
+        'country': 'category',
+        'latitude': 'float64',
+        'longitude': 'float64',
+        'traffic_source': 'category',
+        'created_at': 'datetime',
+    },
+    'products': {
+        'id': 'int32',
+        'cost': 'float64',
+        'category': 'category',
+        'name': 'string',
+        'brand': 'category',
+        'retail_price': 'float64',
+        'department': 'category',
+        'sku': 'string',
+        'distribution_center_id': 'Int32',
+    },
+    'inventory_items': {
+        'id': 'int32',
+        'product_id': 'int32',
+        'created_at': 'datetime',
+        'sold_at': 'datetime',
+        'cost': 'float64',
+        'product_category': 'category',
+        'product_name': 'string',
+        'product_brand': 'category',
+        'product_retail_price': 'float64',
+        'product_department': 'category',
+        'product_sku': 'string',
+        'product_distribution_center_id': 'Int32',
+    },
+    'orders': {
+        'order_id': 'int32',
+        'user_id': 'int32',
+        'status': 'category',
+        'gender': 'category',
+        'created_at': 'datetime',
+        'returned_at': 'datetime',
+        'shipped_at': 'datetime',
+        'delivered_at': 'datetime',
+        'num_of_item': 'Int16',
+    },
+    'order_items': {
+        'id': 'int32',
+        'order_id': 'int32',
+        'user_id': 'int32',
+        'product_id': 'int32',
+        'inventory_item_id': 'int32',
+        'status': 'category',
+        'created_at': 'datetime',
+        'shipped_at': 'datetime',
+        'delivered_at': 'datetime',
+        'returned_at': 'datetime',
+    },
+}
+
+def csv_path(table, data_dir=ARCHIVE_DIR):
+    """Return the path of the raw CSV for a table"""
+    return os.path.join(data_dir, f'{table}.csv')
+
+def parquet_path(table, staging_dir=STAGING_DIR):
+    """Return the path of the staged Parquet file for a table"""
+    return os.path.join(staging_dir, f'{table}.parquet')
+
+def _parse_timestamps(series, column=None):
+    """Parse a timestamp column in one vectorized pass, stored as naive UTC"""
+    # The archive mixes whole and fractional seconds and ' UTC' / '+00:00'
+    # suffixes, so each value is parsed on its own instead of assuming the
+    # format of the first row
+    parsed = pd.to_datetime(series, errors='coerce', utc=True, format='mixed')
+    failed = parsed.isna() & series.notna() & (series.astype('string').str.strip() != '')
+    if failed.any():
+        raise ValueError(
+            f"{failed.sum()} unparseable timestamps in {column or series.name}, "
+            f"e.g. {series[failed].iloc[0]!r}"
+        )
+    return parsed.dt.tz_localize(None)
+
+def read_csv_typed(table, path=None):
+    """Read an archive CSV with the explicit dtypes from TABLE_SCHEMAS"""
+    schema = TABLE_SCHEMAS[table]
+    path = path or csv_path(table)
+    datetime_columns = [col for col, dtype in schema.items() if dtype == 'datetime']
+    dtypes = {col: dtype for col, dtype in schema.items() if dtype != 'datetime'}
+
+    df = pd.read_csv(path, usecols=list(schema), dtype=dtypes)
+    for col in datetime_columns:
+        df[col] = _parse_timestamps(df[col], f'{table}.{col}')
+    return df[list(schema)]
+
+def convert_table(table, data_dir=ARCHIVE_DIR, staging_dir=STAGING_DIR, compression='zstd'):
+    """Convert one archive CSV into a typed, compressed Parquet file"""
+    df = read_csv_typed(table, csv_path(table, data_dir))
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(staging_dir, exist_ok=True)
+    output_path = parquet_path(table, staging_dir)
+    pq.write_table(arrow_table, output_path, compression=compression)
+    return output_path, len(df)
+
+def convert_archive(data_dir=ARCHIVE_DIR, staging_dir=STAGING_DIR):
+    """Convert every archive CSV that exists into the Parquet staging directory"""
+    converted = {}
+    for table in TABLE_SCHEMAS:
+        if not os.path.exists(csv_path(table, data_dir)):
+            print(f"Skipping {table}: {csv_path(table, data_dir)} not found")
+            continue
+        output_path, rows = convert_table(table, data_dir, staging_dir)
+        converted[table] = output_path
+        print(f"Converted {rows} {table} rows to {output_path}")
+    return converted
+
+def has_staged(table, staging_dir=STAGING_DIR):
+    """Check whether a staged Parquet file exists for a table"""
+    return os.path.exists(parquet_path(table, staging_dir))
+
+def read_parquet(path, columns=None, filters=None):
+    """Read a Parquet file as an Arrow table, memory-mapped with column projection"""
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+def read_arrow(table, columns=None, filters=None, staging_dir=STAGING_DIR):
+    """Read a staged table as an Arrow table"""
+    return read_parquet(parquet_path(table, staging_dir), columns, filters)
+
+def read_frame(table, columns=None, filters=None, staging_dir=STAGING_DIR):
+    """Read a staged table into pandas, keeping categorical columns categorical"""
+    return read_arrow(table, columns, filters, staging_dir).to_pandas()
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else ARCHIVE_DIR
+    staging_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(data_dir, 'parquet')
+    convert_archive(data_dir, staging_dir)
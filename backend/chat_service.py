@@ -1,40 +1,210 @@
 import os
 import json
+import threading
+import time
+from collections import OrderedDict
 from groq import Groq
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func, and_, desc
-from models import Product, InventoryItem, Order, OrderItem, User
+from models import User
+import queries
+from entity_extractor import CatalogEntityExtractor
+from geo_index import NearestCenterIndex
+from single_flight import SingleFlight
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Canonical messages used to warm the intent cache and the LLM connection
+WARM_UP_MESSAGES = [
+    "What are the most popular products?",
+    "What's the status of my order?",
+    "How many Classic T-Shirts are in stock?",
+    "What categories and brands do you have?",
+]
+
+# Intents whose answer doesn't depend on extracted entities, so the last
+# answer can be served again when the service is shedding load
+CACHEABLE_INTENTS = ('top_products', 'general_inquiry')
+
+# Entities each handler's answer depends on; identical concurrent questions
+# (same intent and entities) share a single handler execution
+HANDLER_KEY_ENTITIES = {
+    'top_products': (),
+    'general_inquiry': (),
+    'order_status': ('order_id',),
+    'stock_inquiry': ('product_ids', 'product_name'),
+}
+
+def normalize_message(message):
+    """Normalize a message for cache lookups"""
+    return ' '.join(message.lower().split())
+
+def _normalize_entity(value):
+    """Make an entity value hashable and insensitive to case and spacing"""
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(_normalize_entity(item) for item in value))
+    if isinstance(value, str):
+        return normalize_message(value)
+    return value
+
 class ChatService:
     def __init__(self):
         self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+        self.intent_cache_size = int(os.getenv('INTENT_CACHE_SIZE', 1024))
+        self.catalog_cache_ttl = float(os.getenv('CATALOG_CACHE_TTL', 300))
+        self._intent_cache = OrderedDict()
+        self._catalog_summary = None
+        self._catalog_loaded_at = 0
+        self.answer_cache_ttl = float(os.getenv('ANSWER_CACHE_TTL', 300))
+        self._answer_cache = {}
+        self.entity_extractor = CatalogEntityExtractor()
+        self._entities_checked_at = 0
+        self._center_index = None
+        # Warm-up runs before gunicorn's first worker heartbeat, so it must
+        # finish well inside GUNICORN_TIMEOUT even when the LLM is unreachable
+        self.warm_up_budget = float(os.getenv('WARM_UP_BUDGET', 15))
+        self.warm_up_llm_timeout = float(os.getenv('WARM_UP_LLM_TIMEOUT', 5))
+        single_flight_timeout = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', 30))
+        self._classification_flight = SingleFlight(single_flight_timeout)
+        self._handler_flight = SingleFlight(single_flight_timeout)
+        # Replay mode: answer classifications from a traffic capture instead of the LLM
+        replay_path = os.getenv('LLM_REPLAY_CAPTURE')
+        if replay_path:
+            from traffic_capture import load_recorded_classifications
+            self._recorded_intents = load_recorded_classifications(replay_path)
+        else:
+            self._recorded_intents = None
+        self._lock = threading.Lock()
+    
+    def warm_up(self, session):
+        """Prime the catalog cache, intent cache and LLM connection before serving traffic"""
+        deadline = time.monotonic() + self.warm_up_budget
+        checks = {}
+        self._load_catalog_summary(session)
+        self._refresh_entity_extractor(session, force=True)
+        self._center_index = NearestCenterIndex.from_session(session)
+        checks['catalog'] = 'ok'
         
-    def generate_response(self, user_message, conversation_id, session):
-        """Generate AI response using Groq LLM"""
+        if self._recorded_intents is not None:
+            checks['llm'] = 'replay'
+            return checks
+        if not os.getenv('GROQ_API_KEY'):
+            checks['llm'] = 'skipped'
+            return checks
+        
+        try:
+            # Classifying the canonical messages opens the LLM client's
+            # connection pool and seeds the intent cache in one go. Each call
+            # gets a short timeout and no retries, within the overall budget.
+            checks['llm'] = 'ok'
+            for message in WARM_UP_MESSAGES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    checks['llm'] = 'partial: warm-up budget exhausted'
+                    break
+                client = self.groq_client.with_options(
+                    timeout=min(self.warm_up_llm_timeout, remaining), max_retries=0
+                )
+                self._classify_with_llm(message, client)
+        except Exception as e:
+            checks['llm'] = f'error: {e}'
+        return checks
+        
+    def generate_response(self, user_message, conversation_id, session, read_session=None, trace=None,
+                          location=None, user_id=None):
+        """Generate AI response using Groq LLM
+        
+        Read-only catalog handlers use read_session (e.g. a replica) when given;
+        order lookups stay on the primary session so fresh orders are visible.
+        When a trace dict is given, the classification and its source are
+        recorded in it for traffic capture. Stock answers name the nearest
+        shipping center for the given (latitude, longitude), or else for the
+        conversation's user when user_id is known.
+        """
+        read_session = read_session or session
         try:
             # Analyze the user's intent and extract relevant information
-            intent_analysis = self._analyze_intent(user_message)
+            intent_analysis = self._analyze_intent(user_message, trace)
+            intent_analysis = self._add_catalog_entities(intent_analysis, user_message, read_session)
             
             # Based on intent, query the database for relevant information
-            if intent_analysis['intent'] == 'top_products':
-                return self._handle_top_products_query(intent_analysis, session)
-            elif intent_analysis['intent'] == 'order_status':
-                return self._handle_order_status_query(intent_analysis, session)
-            elif intent_analysis['intent'] == 'stock_inquiry':
-                return self._handle_stock_inquiry(intent_analysis, session)
-            elif intent_analysis['intent'] == 'general_inquiry':
-                return self._handle_general_inquiry(intent_analysis, session)
+            intent = intent_analysis['intent']
+            if intent == 'top_products':
+                handle = lambda: self._handle_top_products_query(intent_analysis, read_session)
+            elif intent == 'order_status':
+                handle = lambda: self._handle_order_status_query(intent_analysis, session)
+            elif intent == 'stock_inquiry':
+                location = location or self._user_location(user_id, read_session)
+                handle = lambda: self._handle_stock_inquiry(intent_analysis, read_session, location)
+            elif intent == 'general_inquiry':
+                handle = lambda: self._handle_general_inquiry(intent_analysis, read_session)
             else:
                 return self._handle_clarification_request(user_message)
+            
+            key_location = location if intent == 'stock_inquiry' else None
+            return self._handler_flight.do(self._handler_key(intent_analysis, key_location), handle)
                 
         except Exception as e:
             return f"I apologize, but I encountered an error while processing your request. Please try again or rephrase your question."
     
-    def _analyze_intent(self, message):
-        """Analyze user message to determine intent and extract entities"""
+    def coalescing_stats(self):
+        """Deduplication counters for LLM classifications and handler queries"""
+        return {
+            "classification": self._classification_flight.stats(),
+            "handlers": self._handler_flight.stats()
+        }
+    
+    def _handler_key(self, intent_analysis, location=None):
+        """Key identifying handler calls that produce the same answer"""
+        intent = intent_analysis['intent']
+        entities = intent_analysis.get('entities') or {}
+        values = tuple(_normalize_entity(entities.get(name)) for name in HANDLER_KEY_ENTITIES[intent])
+        return intent, values, location
+    
+    def generate_degraded_response(self, user_message):
+        """Answer using only the local classifier and cached answers, or None if neither can"""
+        intent = self._classify_locally(user_message)['intent']
+        with self._lock:
+            cached = self._answer_cache.get(intent)
+        if cached and time.monotonic() - cached[1] < self.answer_cache_ttl:
+            return cached[0]
+        return None
+    
+    def _remember_answer(self, intent, response):
+        """Keep the latest answer for an entity-independent intent"""
+        if intent in CACHEABLE_INTENTS:
+            with self._lock:
+                self._answer_cache[intent] = (response, time.monotonic())
+    
+    def _refresh_entity_extractor(self, session, force=False):
+        """Pick up catalog changes at most once per catalog cache TTL"""
+        now = time.monotonic()
+        if not force and now - self._entities_checked_at < self.catalog_cache_ttl:
+            return
+        self._entities_checked_at = now
+        self.entity_extractor.refresh(session)
+    
+    def _add_catalog_entities(self, intent_analysis, message, session):
+        """Merge entities found by the local catalog matcher into the intent analysis"""
+        try:
+            self._refresh_entity_extractor(session)
+            found = self.entity_extractor.extract(message)
+        except Exception as e:
+            return intent_analysis
+        
+        # Copy rather than mutate: the analysis may be shared via the intent cache
+        entities = dict(intent_analysis.get('entities') or {})
+        if found['product_ids']:
+            entities['product_ids'] = found['product_ids']
+            entities['product_name'] = found['product_names'][0]
+        for key, values in (('brand', found['brands']), ('category', found['categories']),
+                            ('department', found['departments'])):
+            if values and not entities.get(key):
+                entities[key] = values[0]
+        return dict(intent_analysis, entities=entities)
+    
+    def _classify_with_llm(self, message, client=None):
+        """Classify a message with the LLM (or the given client) and cache the result"""
         prompt = f"""
         Analyze the following customer support message and determine the intent and extract relevant entities.
         
@@ -68,48 +238,69 @@ class ChatService:
         }}
         """
         
-        try:
-            response = self.groq_client.chat.completions.create(
+        if self._recorded_intents is not None:
+            # Unrecorded messages raise KeyError and fall back to local
+            # classification, as they did when the LLM failed during capture
+            result, latency_ms = self._recorded_intents[normalize_message(message)]
+            time.sleep(latency_ms / 1000)
+        else:
+            response = (client or self.groq_client).chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
                 model="llama3-8b-8192",
                 temperature=0.1,
                 max_tokens=500
             )
-            
             result = json.loads(response.choices[0].message.content.strip())
-            return result
-            
-        except Exception as e:
-            # Fallback to simple keyword matching
-            message_lower = message.lower()
-            if any(keyword in message_lower for keyword in ['top', 'best', 'most sold', 'popular', 'bestseller']):
-                return {"intent": "top_products", "entities": {}, "confidence": 0.7}
-            elif any(keyword in message_lower for keyword in ['order', 'status', 'tracking', 'shipped', 'delivered']):
-                return {"intent": "order_status", "entities": {}, "confidence": 0.7}
-            elif any(keyword in message_lower for keyword in ['stock', 'available', 'inventory', 'left', 'in stock']):
-                return {"intent": "stock_inquiry", "entities": {}, "confidence": 0.7}
-            else:
-                return {"intent": "general_inquiry", "entities": {}, "confidence": 0.5}
+        
+        with self._lock:
+            self._intent_cache[normalize_message(message)] = result
+            if len(self._intent_cache) > self.intent_cache_size:
+                self._intent_cache.popitem(last=False)
+        return result
+    
+    def _analyze_intent(self, message, trace=None):
+        """Analyze user message to determine intent and extract entities"""
+        key = normalize_message(message)
+        started = time.perf_counter()
+        with self._lock:
+            cached = self._intent_cache.get(key)
+            if cached is not None:
+                self._intent_cache.move_to_end(key)
+        
+        if cached is not None:
+            source, result = 'cache', cached
+        else:
+            try:
+                # Identical messages arriving together share one LLM call
+                source, result = 'llm', self._classification_flight.do(key, lambda: self._classify_with_llm(message))
+            except Exception as e:
+                source, result = 'local', self._classify_locally(message)
+        
+        if trace is not None:
+            trace.update(
+                intent_analysis=result,
+                classified_by=source,
+                classify_ms=round((time.perf_counter() - started) * 1000, 2)
+            )
+        return result
+    
+    def _classify_locally(self, message):
+        """Classify a message with simple keyword matching"""
+        message_lower = message.lower()
+        if any(keyword in message_lower for keyword in ['top', 'best', 'most sold', 'popular', 'bestseller']):
+            return {"intent": "top_products", "entities": {}, "confidence": 0.7}
+        elif any(keyword in message_lower for keyword in ['order', 'status', 'tracking', 'shipped', 'delivered']):
+            return {"intent": "order_status", "entities": {}, "confidence": 0.7}
+        elif any(keyword in message_lower for keyword in ['stock', 'available', 'inventory', 'left', 'in stock']):
+            return {"intent": "stock_inquiry", "entities": {}, "confidence": 0.7}
+        else:
+            return {"intent": "general_inquiry", "entities": {}, "confidence": 0.5}
     
     def _handle_top_products_query(self, intent_analysis, session):
         """Handle queries about top-selling products"""
         try:
             # Query for top 5 most sold products
-            top_products = session.query(
-                Product.name,
-                Product.brand,
-                Product.category,
-                Product.retail_price,
-                func.count(InventoryItem.id).label('sold_count')
-            ).join(
-                InventoryItem, Product.id == InventoryItem.product_id
-            ).filter(
-                InventoryItem.sold_at.isnot(None)
-            ).group_by(
-                Product.id, Product.name, Product.brand, Product.category, Product.retail_price
-            ).order_by(
-                desc('sold_count')
-            ).limit(5).all()
+            top_products = session.execute(queries.top_products(5)).all()
             
             if not top_products:
                 return "I couldn't find any sales data at the moment. Please try again later."
@@ -121,6 +312,7 @@ class ChatService:
                 response += f"   - Price: ${product.retail_price:.2f}\n"
                 response += f"   - Units Sold: {product.sold_count}\n\n"
             
+            self._remember_answer('top_products', response)
             return response
             
         except Exception as e:
@@ -141,13 +333,13 @@ class ChatService:
             except ValueError:
                 return f"The order ID '{order_id}' doesn't appear to be valid. Please provide a numeric order ID."
             
-            order = session.query(Order).filter_by(order_id=order_id).first()
+            order = session.scalars(queries.order_by_id(order_id)).first()
             
             if not order:
                 return f"I couldn't find an order with ID {order_id}. Please double-check the order ID and try again."
             
             # Get order items
-            order_items = session.query(OrderItem).join(Product).filter_by(order_id=order_id).all()
+            order_items = session.execute(queries.order_items(order_id)).all()
             
             response = f"**Order #{order_id} Status:**\n\n"
             response += f"Status: {order.status}\n"
@@ -162,27 +354,66 @@ class ChatService:
             
             if order_items:
                 response += "**Items in this order:**\n"
-                for item in order_items:
-                    response += f"- {item.product.name} (Status: {item.status})\n"
+                for item, product in order_items:
+                    response += f"- {product.name} (Status: {item.status})\n"
             
             return response
             
         except Exception as e:
             return f"I encountered an issue checking the order status. Please try again."
     
-    def _handle_stock_inquiry(self, intent_analysis, session):
+    def _user_location(self, user_id, session):
+        """Return (latitude, longitude) of a known user, without querying for anonymous chats"""
+        if user_id is None:
+            return None
+        try:
+            user = session.get(User, user_id)
+        except Exception as e:
+            return None
+        if user is None or user.latitude is None or user.longitude is None:
+            return None
+        return user.latitude, user.longitude
+    
+    def _get_center_index(self, session):
+        """Return the distribution center spatial index, building it on first use"""
+        if self._center_index is None:
+            self._center_index = NearestCenterIndex.from_session(session)
+        return self._center_index
+    
+    def _describe_shipping_origin(self, stock_by_center, location, session):
+        """Say which distribution center in-stock units ship from, nearest first when the user's location is known"""
+        center_ids = [center_id for center_id, count in stock_by_center.items() if center_id is not None and count]
+        if not center_ids:
+            return None
+        
+        index = self._get_center_index(session)
+        if location:
+            nearest = index.nearest(location[0], location[1], allowed_ids=center_ids)
+            if nearest:
+                center_id, distance_km = nearest
+                return f"Nearest in-stock unit ships from: {index.names[center_id]} (~{distance_km:,.0f} km away)"
+        
+        names = [index.names[center_id] for center_id in center_ids if center_id in index.names]
+        return f"Ships from: {', '.join(names)}" if names else None
+    
+    def _handle_stock_inquiry(self, intent_analysis, session, location=None):
         """Handle queries about product stock/inventory"""
         entities = intent_analysis.get('entities', {})
         product_name = entities.get('product_name')
+        product_ids = entities.get('product_ids')
         
-        if not product_name:
+        if not product_name and not product_ids:
             return "To check stock availability, please specify the product name. For example: 'How many Classic T-Shirts are left in stock?'"
         
         try:
-            # Search for products by name (case-insensitive, partial match)
-            products = session.query(Product).filter(
-                Product.name.ilike(f'%{product_name}%')
-            ).all()
+            products = []
+            if product_ids:
+                # Already resolved against the catalog by the entity extractor
+                products = session.scalars(queries.products_by_ids(product_ids)).all()
+            if not products and product_name:
+                # Search for products by name (case-insensitive, partial match);
+                # also covers ids the extractor holds for since-deleted products
+                products = session.scalars(queries.products_matching_name(product_name)).all()
             
             if not products:
                 return f"I couldn't find any products matching '{product_name}'. Could you please check the spelling or try a different product name?"
@@ -193,16 +424,15 @@ class ChatService:
             response = f"**Stock information for products matching '{product_name}':**\n\n"
             
             for product in products:
-                # Count available inventory (not sold)
-                available_stock = session.query(InventoryItem).filter(
-                    and_(
-                        InventoryItem.product_id == product.id,
-                        InventoryItem.sold_at.is_(None)
-                    )
-                ).count()
+                # Count available inventory (not sold) per shipping distribution center
+                stock_by_center = dict(session.execute(queries.available_stock_by_center(product.id)).all())
+                available_stock = sum(stock_by_center.values())
+                shipping_origin = self._describe_shipping_origin(stock_by_center, location, session)
                 
                 response += f"**{product.name}** by {product.brand}\n"
                 response += f"- Available Stock: {available_stock} units\n"
+                if shipping_origin:
+                    response += f"- {shipping_origin}\n"
                 response += f"- Price: ${product.retail_price:.2f}\n"
                 response += f"- Category: {product.category}\n\n"
             
@@ -214,10 +444,10 @@ class ChatService:
     def _handle_general_inquiry(self, intent_analysis, session):
         """Handle general inquiries about products, categories, etc."""
         try:
-            # Get some general statistics
-            total_products = session.query(Product).count()
-            categories = session.query(Product.category).distinct().limit(10).all()
-            brands = session.query(Product.brand).distinct().limit(10).all()
+            summary = self._get_catalog_summary(session)
+            total_products = summary['total_products']
+            categories = summary['categories']
+            brands = summary['brands']
             
             response = "**Welcome to our Customer Support!**\n\n"
             response += f"We have {total_products} products available in our store.\n\n"
@@ -238,11 +468,33 @@ class ChatService:
             response += "- Check product availability\n"
             response += "- Browse products by category or brand\n"
             
+            self._remember_answer('general_inquiry', response)
             return response
             
         except Exception as e:
             return "Hello! I'm here to help you with your shopping needs. You can ask me about order status, product availability, or our top-selling items."
     
+    def _load_catalog_summary(self, session):
+        """Query the general catalog statistics and cache them"""
+        summary = {
+            'total_products': session.scalar(queries.product_count()),
+            'categories': session.execute(queries.catalog_categories(10)).all(),
+            'brands': session.execute(queries.catalog_brands(10)).all()
+        }
+        with self._lock:
+            self._catalog_summary = summary
+            self._catalog_loaded_at = time.monotonic()
+        return summary
+    
+    def _get_catalog_summary(self, session):
+        """Return the cached catalog statistics, reloading them once stale"""
+        with self._lock:
+            summary = self._catalog_summary
+            fresh = time.monotonic() - self._catalog_loaded_at < self.catalog_cache_ttl
+        if summary is not None and fresh:
+            return summary
+        return self._load_catalog_summary(session)
+    
     def _handle_clarification_request(self, message):
         """Handle unclear messages by asking clarifying questions"""
         return """I'd be happy to help! Could you please clarify what you're looking for? 
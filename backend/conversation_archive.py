@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import ArchivedConversation, Message, create_database_engine, get_session
+import queries
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bound the IN list of the delete (SQLite allows 999 bound parameters by default)
+DELETE_CHUNK_SIZE = 500
+
+def serialize_message(message):
+    """Convert a Message row into the API message format"""
+    return {
+        "type": message.message_type,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat()
+    }
+
+def pack_messages(messages):
+    """Compress a list of API-format messages into one blob"""
+    return zlib.compress(json.dumps(messages, separators=(',', ':')).encode('utf-8'), 9)
+
+def unpack_messages(payload):
+    """Decompress a blob written by pack_messages"""
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+def get_archive(session, conversation_id):
+    """Return the archive row of a conversation, or None"""
+    return session.scalars(queries.conversation_archive(conversation_id)).first()
+
+def load_archived_messages(session, conversation_id):
+    """Rehydrate the archived messages of a conversation, oldest first"""
+    archive = get_archive(session, conversation_id)
+    if archive is None:
+        return []
+    return unpack_messages(archive.payload)
+
+def archived_message_counts(session, conversation_ids):
+    """Map conversation id to its number of archived messages"""
+    if not conversation_ids:
+        return {}
+    rows = session.query(
+        ArchivedConversation.conversation_id, ArchivedConversation.message_count
+    ).filter(ArchivedConversation.conversation_id.in_(conversation_ids)).all()
+    return dict(rows)
+
+def archive_conversation(session, conversation_id):
+    """Move a conversation's hot messages into its compressed archive row"""
+    messages = session.query(Message).filter_by(
+        conversation_id=conversation_id
+    ).order_by(Message.timestamp, Message.id).all()
+    if not messages:
+        return 0
+
+    archive = get_archive(session, conversation_id)
+    if archive is None:
+        archive = ArchivedConversation(conversation_id=conversation_id)
+        session.add(archive)
+        archived = []
+    else:
+        # The conversation was reactivated after an earlier archive run
+        archived = unpack_messages(archive.payload)
+
+    archived.extend(serialize_message(message) for message in messages)
+    archive.payload = pack_messages(archived)
+    archive.message_count = len(archived)
+    archive.last_message_at = messages[-1].timestamp
+    archive.archived_at = datetime.utcnow()
+
+    # Delete exactly the rows packed above. An id range is not enough: a
+    # concurrent insert can hold a lower id but commit after our read.
+    packed_ids = [message.id for message in messages]
+    for start in range(0, len(packed_ids), DELETE_CHUNK_SIZE):
+        session.query(Message).filter(
+            Message.id.in_(packed_ids[start:start + DELETE_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    return len(messages)
+
+def archive_idle_conversations(session, idle_before, batch_size=100):
+    """Archive every conversation whose newest hot message is older than idle_before"""
+    conversations = 0
+    messages = 0
+    while True:
+        idle_ids = [row[0] for row in session.query(Message.conversation_id).group_by(
+            Message.conversation_id
+        ).having(func.max(Message.timestamp) < idle_before).limit(batch_size).all()]
+        if not idle_ids:
+            break
+
+        for conversation_id in idle_ids:
+            messages += archive_conversation(session, conversation_id)
+        session.commit()
+        conversations += len(idle_ids)
+        print(f"Archived {conversations} conversations ({messages} messages) so far")
+    return conversations, messages
+
+def main():
+    """Archive conversations idle for more than ARCHIVE_IDLE_DAYS (or argv[1]) days"""
+    idle_days = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv('ARCHIVE_IDLE_DAYS', 30))
+    idle_before = datetime.utcnow() - timedelta(days=idle_days)
+
+    engine = create_database_engine()
+    session = get_session(engine)
+    try:
+        conversations, messages = archive_idle_conversations(session, idle_before)
+        print(f"Archived {conversations} conversations idle since {idle_before.isoformat()} ({messages} messages)")
+    except Exception as e:
+        print(f"Error archiving conversations: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text
+from models import create_database_engine, get_database_url, get_replica_urls, get_session
+
+class _Replica:
+    def __init__(self, url, engine):
+        self.url = url
+        self.engine = engine
+        self.healthy = True
+        self.lag = None
+        self.checked_at = 0.0
+        self.error = None
+
+def _replication_lag(conn):
+    """Return replica lag in seconds, None if replication is broken, 0 if unknown"""
+    # A replica must carry the schema; an empty or fresh database answers
+    # SELECT 1 but fails every routed read with "no such table"
+    conn.execute(text('SELECT 1 FROM products LIMIT 1'))
+    if conn.dialect.name == 'mysql':
+        for statement, column in (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                                  ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')):
+            try:
+                row = conn.execute(text(statement)).mappings().first()
+            except Exception:
+                continue
+            if row is None:
+                # Not configured as a replica, e.g. a manually synced copy
+                return 0
+            return row[column]
+    # SQLite files and other backends expose no replication lag
+    return 0
+
+class DatabaseRouter:
+    """Routes read-only sessions to healthy, fresh replicas and everything else to the primary"""
+
+    def __init__(self, primary_url, replica_urls=(), max_lag=5.0, check_interval=5.0, retry_interval=30.0):
+        self.primary = create_database_engine(primary_url)
+        self.replicas = [_Replica(url, create_database_engine(url)) for url in replica_urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_interval = retry_interval
+
+        # Replicas may trail by up to max_lag, measured at most check_interval
+        # ago, so conversations written within this window read from the primary
+        self.read_your_writes_window = max_lag + check_interval
+        self._recent_writes = {}
+        self._last_write = 0.0
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._monitor_pid = None
+        self._stats = {"primary_reads": 0, "replica_reads": 0, "fallbacks": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build a router from DATABASE_URL/DB_* and DB_REPLICA_URLS"""
+        return cls(
+            get_database_url(),
+            get_replica_urls(),
+            max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', 5.0)),
+            check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5.0)),
+            retry_interval=float(os.getenv('DB_REPLICA_RETRY_INTERVAL', 30.0))
+        )
+
+    def primary_session(self):
+        """Session for writes and reads that must see them"""
+        return get_session(self.primary)
+
+    def read_session(self):
+        """Session for read-only work, on a replica when one is usable"""
+        self._ensure_monitor()
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._round_robin) % len(self.replicas)]
+            if self._is_usable(replica):
+                self._count('replica_reads')
+                return get_session(replica.engine)
+        if self.replicas:
+            self._count('fallbacks')
+        self._count('primary_reads')
+        return self.primary_session()
+
+    def conversation_session(self, session_id=None, last_write_at=None):
+        """Session for conversation reads: primary if the conversation (or any, when None) was just written
+
+        Write markers recorded here only cover this worker. last_write_at is
+        the time (naive UTC) of the caller's latest write as reported by the
+        caller itself, so a write handled by any worker or host is honoured.
+        """
+        if last_write_at is not None:
+            if (datetime.utcnow() - last_write_at).total_seconds() < self.read_your_writes_window:
+                self._count('primary_reads')
+                return self.primary_session()
+        now = time.monotonic()
+        with self._lock:
+            if session_id is None:
+                written_at = self._last_write
+            else:
+                written_at = self._recent_writes.get(session_id, 0.0)
+        if now - written_at < self.read_your_writes_window:
+            self._count('primary_reads')
+            return self.primary_session()
+        return self.read_session()
+
+    def is_primary(self, session):
+        """Check whether a session is bound to the primary"""
+        return session.get_bind() is self.primary
+
+    def record_write(self, session_id):
+        """Remember a committed conversation write for read-your-writes routing in this worker"""
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[session_id] = now
+            self._last_write = now
+            if len(self._recent_writes) > 10000:
+                cutoff = now - self.read_your_writes_window
+                self._recent_writes = {
+                    key: written_at for key, written_at in self._recent_writes.items()
+                    if written_at >= cutoff
+                }
+
+    def warm_up(self):
+        """Open a pooled connection on the primary and start monitoring replicas"""
+        with self.primary.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        # Replicas are probed by the monitor thread so a dead replica can't
+        # stall start-up; they take reads once their first probe succeeds
+        self._ensure_monitor()
+        return {replica.url.split('@')[-1]: self._health(replica) for replica in self.replicas}
+
+    def dispose(self):
+        """Drop pooled connections inherited from the parent process after a fork"""
+        self.primary.dispose(close=False)
+        for replica in self.replicas:
+            replica.engine.dispose(close=False)
+
+    def stats(self):
+        """Return routing counters and replica health"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["replicas"] = [{
+            "replica": replica.url.split('@')[-1],
+            "healthy": self._is_usable(replica),
+            "lag": replica.lag,
+            "error": replica.error
+        } for replica in self.replicas]
+        return stats
+
+    def _health(self, replica):
+        if not replica.checked_at:
+            return 'pending'
+        return 'ok' if replica.healthy else replica.error
+
+    def _is_usable(self, replica):
+        """Report a replica's health as last probed by the monitor thread"""
+        # A probe stuck on a dead host stops refreshing checked_at; don't keep
+        # trusting a health result that old
+        max_age = 3 * max(self.check_interval, 1.0)
+        return replica.healthy and time.monotonic() - replica.checked_at < max_age
+
+    def _ensure_monitor(self):
+        """Start this process's replica monitor thread (threads don't survive fork)"""
+        if not self.replicas or self._monitor_pid == os.getpid():
+            return
+        with self._lock:
+            if self._monitor_pid == os.getpid():
+                return
+            self._monitor = threading.Thread(target=self._monitor_replicas, name='replica-monitor', daemon=True)
+            self._monitor_pid = os.getpid()
+            self._monitor.start()
+
+    def _monitor_replicas(self):
+        """Probe each replica every check_interval, or retry_interval while unhealthy"""
+        tick = max(min(self.check_interval, self.retry_interval), 0.5)
+        while True:
+            for replica in self.replicas:
+                interval = self.check_interval if replica.healthy else self.retry_interval
+                if time.monotonic() - replica.checked_at >= interval:
+                    self._probe(replica)
+            time.sleep(tick)
+
+    def _probe(self, replica):
+        """Check that a replica answers and is within the staleness bound"""
+        try:
+            with replica.engine.connect() as conn:
+                lag = _replication_lag(conn)
+            if lag is None:
+                replica.healthy, replica.error = False, 'replication stopped'
+            elif lag > self.max_lag:
+                replica.healthy, replica.error = False, f'lag {lag}s exceeds {self.max_lag}s'
+            else:
+                replica.healthy, replica.error = True, None
+            replica.lag = lag
+        except Exception as e:
+            replica.healthy, replica.error, replica.lag = False, str(e), None
+        replica.checked_at = time.monotonic()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
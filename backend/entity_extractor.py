@@ -0,0 +1,185 @@
+import re
+import threading
+from collections import deque
+from models import Product
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+ENTITY_KINDS = ('product', 'brand', 'category', 'department')
+
+def normalize_token(token):
+    """Fold simple plurals so "T-Shirts" and "t shirt" produce the same tokens"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    """Split text into normalized lowercase word tokens"""
+    # Drop apostrophes so "Levi's" and "levis" tokenize alike
+    text = text.lower().replace("'", "")
+    return [normalize_token(token) for token in TOKEN_RE.findall(text)]
+
+class AhoCorasick:
+    """Multi-pattern matcher over word tokens, finding every pattern in one pass"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]     # pattern id ending at each node
+        self.dict_link = [0]     # nearest proper suffix node with an output
+        self.depth = [0]
+
+    def add(self, tokens, pattern_id):
+        """Insert a token sequence; call build() before searching again"""
+        node = 0
+        for token in tokens:
+            child = self.goto[node].get(token)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][token] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.dict_link.append(0)
+                self.depth.append(self.depth[node] + 1)
+            node = child
+        self.output[node] = pattern_id
+
+    def build(self):
+        """Compute failure and output links breadth first"""
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            self.dict_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(token, 0)
+                self.fail[child] = target if target != child else 0
+                suffix = self.fail[child]
+                self.dict_link[child] = suffix if self.output[suffix] is not None else self.dict_link[suffix]
+                queue.append(child)
+
+    def search(self, tokens):
+        """Yield (start, end, pattern_id) for every match, in linear time"""
+        node = 0
+        for position, token in enumerate(tokens):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            match = node if self.output[node] is not None else self.dict_link[node]
+            while match:
+                yield position + 1 - self.depth[match], position + 1, self.output[match]
+                match = self.dict_link[match]
+
+class CatalogPatterns:
+    """Catalog values compiled into one Aho-Corasick automaton"""
+
+    def __init__(self):
+        self.automaton = AhoCorasick()
+        self.pattern_ids = {}
+        self.patterns = []
+
+    def add_product(self, product_id, name, brand, category, department):
+        """Register a product's name, brand, category and department"""
+        self._add('product', name, product_id)
+        self._add('brand', brand)
+        self._add('category', category)
+        self._add('department', department)
+
+    def _add(self, kind, label, product_id=None):
+        """Register a catalog value as a pattern"""
+        if not label:
+            return
+        tokens = tuple(tokenize(label))
+        if not tokens:
+            return
+        pattern_id = self.pattern_ids.get(tokens)
+        if pattern_id is None:
+            pattern_id = len(self.patterns)
+            self.pattern_ids[tokens] = pattern_id
+            self.patterns.append({})
+            self.automaton.add(tokens, pattern_id)
+        label_and_ids = self.patterns[pattern_id].setdefault(kind, (label, []))
+        if product_id is not None:
+            label_and_ids[1].append(product_id)
+
+class CatalogEntityExtractor:
+    """Finds catalog product names, brands, categories and departments in messages"""
+
+    def __init__(self):
+        self._patterns = CatalogPatterns()
+        self._catalog = {}    # product id -> (name, brand, category, department)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, session):
+        """Sync with the catalog: add new products incrementally, rebuild on edits or deletions"""
+        with self._refresh_lock:
+            return self._refresh(session)
+
+    def _refresh(self, session):
+        # Compare the searchable columns of every product, so renames, brand
+        # edits and a delete paired with an insert are all noticed; the
+        # products table has no version column to rely on
+        rows = session.query(
+            Product.id, Product.name, Product.brand, Product.category, Product.department
+        ).order_by(Product.id).all()
+        catalog = {row[0]: tuple(row[1:]) for row in rows}
+        known = self._catalog
+        if catalog == known:
+            return False
+
+        if any(catalog.get(product_id) != values for product_id, values in known.items()):
+            # Rows changed or went away: rebuild off the lock, then swap in
+            patterns = CatalogPatterns()
+            for product_id, values in catalog.items():
+                patterns.add_product(product_id, *values)
+            patterns.automaton.build()
+            with self._lock:
+                self._patterns = patterns
+                self._catalog = catalog
+            return True
+
+        with self._lock:
+            for product_id, values in catalog.items():
+                if product_id not in known:
+                    self._patterns.add_product(product_id, *values)
+            # Existing trie nodes are kept; only the failure links are recomputed
+            self._patterns.automaton.build()
+            self._catalog = catalog
+        return True
+
+    def extract(self, message):
+        """Return the catalog entities mentioned in a message"""
+        tokens = tokenize(message)
+        with self._lock:
+            matches = list(self._patterns.automaton.search(tokens))
+            patterns = self._patterns.patterns
+
+        # Keep leftmost-longest, non-overlapping matches so a full product
+        # name wins over the brand or category words inside it
+        matches.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        entities = {kind: [] for kind in ENTITY_KINDS}
+        product_ids = []
+        covered_until = 0
+        for start, end, pattern_id in matches:
+            if start < covered_until:
+                continue
+            covered_until = end
+            for kind, (label, ids) in patterns[pattern_id].items():
+                entities[kind].append(label)
+                if kind == 'product':
+                    product_ids.extend(ids)
+
+        return {
+            "product_ids": product_ids,
+            "product_names": entities['product'],
+            "brands": entities['brand'],
+            "categories": entities['category'],
+            "departments": entities['department']
+        }
@@ -0,0 +1,124 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from models import DistributionCenter, User, create_database_engine, get_session
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EARTH_RADIUS_KM = 6371.0088
+
+def to_unit_vectors(latitudes, longitudes):
+    """Project latitude/longitude degrees onto 3D points on the unit sphere"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def chord_to_km(chord):
+    """Convert unit-sphere chord length to great-circle (haversine) distance"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class NearestCenterIndex:
+    """KD-tree over distribution centers for nearest-center lookups
+
+    Points live on the unit sphere, where straight-line (chord) distance is
+    monotonic in great-circle distance, so the Euclidean KD-tree returns the
+    haversine-nearest center.
+    """
+
+    def __init__(self, centers):
+        centers = [center for center in centers if center[2] is not None and center[3] is not None]
+        self.ids = np.array([center[0] for center in centers])
+        self.names = {center[0]: center[1] for center in centers}
+        self._tree = cKDTree(to_unit_vectors(
+            [center[2] for center in centers], [center[3] for center in centers]
+        )) if centers else None
+
+    @classmethod
+    def from_session(cls, session):
+        """Build the index from the distribution_centers table"""
+        return cls(session.query(
+            DistributionCenter.id, DistributionCenter.name,
+            DistributionCenter.latitude, DistributionCenter.longitude
+        ).all())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, latitude, longitude, allowed_ids=None):
+        """Return (center_id, distance_km) of the nearest center, optionally among allowed_ids"""
+        if self._tree is None:
+            return None
+        point = to_unit_vectors([latitude], [longitude])[0]
+        if allowed_ids is None:
+            chord, index = self._tree.query(point, k=1)
+            return int(self.ids[index]), float(chord_to_km(chord))
+
+        # Walk outwards until an allowed center turns up
+        allowed_ids = set(allowed_ids)
+        chords, indexes = self._tree.query(point, k=len(self))
+        for chord, index in zip(np.atleast_1d(chords), np.atleast_1d(indexes)):
+            if self.ids[index] in allowed_ids:
+                return int(self.ids[index]), float(chord_to_km(chord))
+        return None
+
+    def assign(self, latitudes, longitudes):
+        """Vectorized nearest center for many points: (center_ids, distances_km)
+
+        Rows with missing coordinates get center id -1 and NaN distance.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        center_ids = np.full(len(latitudes), -1, dtype=np.int64)
+        distances = np.full(len(latitudes), np.nan)
+        valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        if self._tree is None or not valid.any():
+            return center_ids, distances
+
+        chords, indexes = self._tree.query(to_unit_vectors(latitudes[valid], longitudes[valid]), k=1, workers=-1)
+        center_ids[valid] = self.ids[indexes]
+        distances[valid] = chord_to_km(chords)
+        return center_ids, distances
+
+def load_user_locations(session):
+    """Load user coordinates, from the staged Parquet archive when available"""
+    from archive_store import has_staged, read_frame
+    if has_staged('users'):
+        return read_frame('users', columns=['id', 'latitude', 'longitude'])
+    rows = session.query(User.id, User.latitude, User.longitude).all()
+    return pd.DataFrame(rows, columns=['id', 'latitude', 'longitude'])
+
+def main():
+    """Assign every user to their nearest distribution center"""
+    output_path = sys.argv[1] if len(sys.argv) > 1 else 'user_nearest_centers.parquet'
+    engine = create_database_engine()
+    session = get_session(engine)
+    try:
+        index = NearestCenterIndex.from_session(session)
+        users = load_user_locations(session)
+    finally:
+        session.close()
+
+    started = time.perf_counter()
+    center_ids, distances = index.assign(users['latitude'].to_numpy(), users['longitude'].to_numpy())
+    elapsed = time.perf_counter() - started
+
+    result = pd.DataFrame({
+        'user_id': users['id'].to_numpy(),
+        'nearest_center_id': center_ids,
+        'distance_km': distances
+    })
+    result.to_parquet(output_path, index=False)
+    print(f"Assigned {len(result)} users to {len(index)} centers in {elapsed:.2f}s -> {output_path}")
+
+if __name__ == "__main__":
+    main()
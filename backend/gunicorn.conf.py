@@ -0,0 +1,30 @@
+import multiprocessing
+import os
+
+# Production server settings for app:app, e.g.
+#   gunicorn -c gunicorn.conf.py app:app
+bind = f"0.0.0.0:{os.getenv('PORT', 5001)}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+# More threads than CHAT_MAX_CONCURRENCY so excess chat requests reach the
+# admission queue (and get shed quickly) instead of waiting in the socket backlog
+# models.pool_options() sizes each worker's database pool from this value
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+# Import the app once in the master so workers share its memory pages
+preload_app = True
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool instead of the master's"""
+    from app import dispose_engines
+    dispose_engines()
+
+def post_worker_init(worker):
+    """Warm the pool and caches before the worker accepts connections"""
+    # Runs before the worker's first heartbeat; WARM_UP_BUDGET (default 15s)
+    # keeps it well inside `timeout` even when the LLM is unreachable
+    from app import warm_up
+    if not warm_up():
+        worker.log.warning("Worker %s started before warm-up succeeded; /ready reports 503", worker.pid)
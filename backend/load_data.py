@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 from datetime import datetime
+from archive_store import parquet_path, read_parquet
+from migrations import upgrade
 from models import (
     create_database_engine, create_tables, get_session,
     User, DistributionCenter, Product, InventoryItem, Order, OrderItem
@@ -13,15 +15,24 @@ def parse_datetime(date_string):
     """Parse datetime string, handling None values"""
     if pd.isna(date_string) or date_string == '':
         return None
+    if isinstance(date_string, pd.Timestamp):
+        # Staged Parquet columns are already typed; no string parsing needed
+        return date_string.to_pydatetime()
     try:
         return pd.to_datetime(date_string)
     except:
         return None
 
+def read_dataset(path):
+    """Read a staged Parquet file memory-mapped, falling back to the raw CSV"""
+    if path.endswith('.parquet'):
+        return read_parquet(path).to_pandas()
+    return pd.read_csv(path)
+
 def load_distribution_centers(session, csv_path):
     """Load distribution centers data"""
     print("Loading distribution centers...")
-    df = pd.read_csv(csv_path)
+    df = read_dataset(csv_path)
     
     for _, row in df.iterrows():
         center = DistributionCenter(
@@ -38,7 +49,7 @@ def load_distribution_centers(session, csv_path):
 def load_users(session, csv_path):
     """Load users data"""
     print("Loading users...")
-    df = pd.read_csv(csv_path)
+    df = read_dataset(csv_path)
     
     for _, row in df.iterrows():
         user = User(
@@ -66,7 +77,7 @@ def load_users(session, csv_path):
 def load_products(session, csv_path):
     """Load products data"""
     print("Loading products...")
-    df = pd.read_csv(csv_path)
+    df = read_dataset(csv_path)
     
     for _, row in df.iterrows():
         product = Product(
@@ -88,7 +99,7 @@ def load_products(session, csv_path):
 def load_inventory_items(session, csv_path):
     """Load inventory items data"""
     print("Loading inventory items...")
-    df = pd.read_csv(csv_path)
+    df = read_dataset(csv_path)
     
     for _, row in df.iterrows():
         inventory_item = InventoryItem(
@@ -113,7 +124,7 @@ def load_inventory_items(session, csv_path):
 def load_orders(session, csv_path):
     """Load orders data"""
     print("Loading orders...")
-    df = pd.read_csv(csv_path)
+    df = read_dataset(csv_path)
     
     for _, row in df.iterrows():
         order = Order(
@@ -135,7 +146,7 @@ def load_orders(session, csv_path):
 def load_order_items(session, csv_path):
     """Load order items data"""
     print("Loading order items...")
-    df = pd.read_csv(csv_path)
+    df = read_dataset(csv_path)
     
     for _, row in df.iterrows():
         order_item = OrderItem(
@@ -160,18 +171,22 @@ def main():
     # Create database engine and tables
     engine = create_database_engine()
     create_tables(engine)
+    upgrade(engine)
     session = get_session(engine)
     
     # Define CSV file paths
     data_dir = "../archive"
-    csv_files = {
-        'distribution_centers': os.path.join(data_dir, 'distribution_centers.csv'),
-        'users': os.path.join(data_dir, 'users.csv'),
-        'products': os.path.join(data_dir, 'products.csv'),
-        'inventory_items': os.path.join(data_dir, 'inventory_items.csv'),
-        'orders': os.path.join(data_dir, 'orders.csv'),
-        'order_items': os.path.join(data_dir, 'order_items.csv')
-    }
+    staging_dir = os.path.join(data_dir, 'parquet')
+    csv_files = {}
+    for table in ['distribution_centers', 'users', 'products', 'inventory_items', 'orders', 'order_items']:
+        # Prefer the typed Parquet staging files written by archive_store.py
+        staged = parquet_path(table, staging_dir)
+        csv_path = os.path.join(data_dir, f'{table}.csv')
+        if os.path.exists(staged) and os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(staged):
+            print(f"Warning: {csv_path} is newer than {staged}; loading the CSV (re-run archive_store.py to restage)")
+            csv_files[table] = csv_path
+        else:
+            csv_files[table] = staged if os.path.exists(staged) else csv_path
     
     try:
         # Load data in correct order (respecting foreign key constraints)
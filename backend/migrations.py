@@ -0,0 +1,160 @@
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, DateTime, Index,
+    select, func, inspect, text
+)
+from models import create_database_engine, ArchivedConversation
+import queries
+
+# Versioned schema migrations. Each migration must be idempotent so it can be
+# applied to databases created by models.create_tables() (which already carry
+# the indexes declared on the models) as well as to older databases.
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255)),
+    Column('applied_at', DateTime)
+)
+
+def _create_index(conn, table_name, index_name, *columns):
+    """Create an index unless the table is missing or the index already exists"""
+    inspector = inspect(conn)
+    if table_name not in inspector.get_table_names():
+        # create_tables() will build the table with its model indexes
+        return False
+    if index_name in {ix['name'] for ix in inspector.get_indexes(table_name)}:
+        return False
+    table = Table(table_name, MetaData(), *[Column(col) for col in columns])
+    Index(index_name, *[table.c[col] for col in columns]).create(conn)
+    return True
+
+def _add_hot_query_indexes(conn):
+    """Index the columns filtered on by the chat handlers and conversation endpoints"""
+    # conversations.session_id is declared unique, so both MySQL and SQLite
+    # already back it with an index; it needs no migration.
+    _create_index(conn, 'inventory_items', 'ix_inventory_items_product_id_sold_at', 'product_id', 'sold_at')
+    _create_index(conn, 'order_items', 'ix_order_items_order_id', 'order_id')
+    _create_index(conn, 'messages', 'ix_messages_conversation_id_timestamp', 'conversation_id', 'timestamp')
+    _create_index(conn, 'conversations', 'ix_conversations_created_at', 'created_at')
+    _create_index(conn, 'products', 'ix_products_category', 'category')
+    _create_index(conn, 'products', 'ix_products_brand', 'brand')
+
+def _add_archived_conversations(conn):
+    """Create the cold store for archived conversation messages"""
+    ArchivedConversation.__table__.create(conn, checkfirst=True)
+
+def _add_conversation_updated_at_index(conn):
+    """Index conversations.updated_at for list validators and `since` deltas"""
+    _create_index(conn, 'conversations', 'ix_conversations_updated_at', 'updated_at')
+
+MIGRATIONS = [
+    (1, 'Add indexes for hot query paths', _add_hot_query_indexes),
+    (2, 'Add archived_conversations cold store', _add_archived_conversations),
+    (3, 'Add conversations.updated_at index', _add_conversation_updated_at_index),
+]
+
+def current_version(conn):
+    """Return the highest applied migration version, or 0"""
+    schema_migrations.create(conn, checkfirst=True)
+    version = conn.execute(select(func.max(schema_migrations.c.version))).scalar()
+    return version or 0
+
+def upgrade(engine):
+    """Apply every pending migration in order"""
+    with engine.begin() as conn:
+        version = current_version(conn)
+
+    applied = []
+    for migration_version, description, migrate in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration_version,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+        print(f"Applied migration {migration_version}: {description}")
+        applied.append(migration_version)
+    return applied
+
+# Every hot statement, built by the same queries.py builders the handlers and
+# endpoints execute (with sample arguments), paired with the tables each one is
+# allowed to read in full (small catalog tables scanned by design, e.g. the
+# leading-wildcard product name search).
+HOT_QUERIES = [
+    ('top_products', lambda: queries.top_products(5), {'products'}),
+    ('stock_products_by_id', lambda: queries.products_by_ids([1, 2]), set()),
+    ('stock_product_search', lambda: queries.products_matching_name('shirt'), {'products'}),
+    ('stock_available_by_center', lambda: queries.available_stock_by_center(1), set()),
+    ('general_product_count', lambda: queries.product_count(), {'products'}),
+    ('general_categories', lambda: queries.catalog_categories(10), {'products'}),
+    ('general_brands', lambda: queries.catalog_brands(10), {'products'}),
+    ('order_status', lambda: queries.order_by_id(1), set()),
+    ('order_status_items', lambda: queries.order_items(1), set()),
+    ('conversation_lookup', lambda: queries.conversation_by_session('session'), set()),
+    ('conversation_version', lambda: queries.conversation_version(1), set()),
+    ('conversation_history', lambda: queries.conversation_messages(1), set()),
+    ('conversation_history_delta', lambda: queries.conversation_messages(1, datetime(2024, 1, 1)), set()),
+    ('conversation_list_version', lambda: queries.conversation_list_version(), set()),
+    ('conversation_list', lambda: queries.conversation_list(limit=50), set()),
+    ('conversation_list_delta', lambda: queries.conversation_list(datetime(2024, 1, 1), 50), set()),
+    ('conversation_message_counts', lambda: queries.message_counts([1, 2]), set()),
+    ('conversation_archive', lambda: queries.conversation_archive(1), set()),
+]
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+def _full_scans(conn, statement):
+    """Return the tables a statement's query plan reads with a full table scan"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == 'sqlite':
+        scans = set()
+        for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}')):
+            match = _SQLITE_SCAN.match(row[-1])
+            # "SCAN t USING (COVERING) INDEX ..." walks an index, not the table
+            if match and 'USING' not in match.group(2):
+                scans.add(match.group(1))
+        return scans
+    if conn.dialect.name == 'mysql':
+        rows = conn.execute(text(f'EXPLAIN {sql}')).mappings()
+        return {row['table'] for row in rows if row['type'] == 'ALL'}
+    raise ValueError(f"Query plan checks are not supported for {conn.dialect.name}")
+
+def check_query_plans(engine):
+    """Return (query, table) pairs whose plan regressed to a full table scan"""
+    regressions = []
+    with engine.connect() as conn:
+        for name, build_statement, allowed in HOT_QUERIES:
+            for table in sorted(_full_scans(conn, build_statement()) - allowed):
+                regressions.append((name, table))
+    return regressions
+
+def main():
+    """Run migrations or query plan checks from the command line"""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    engine = create_database_engine()
+
+    if command == 'upgrade':
+        upgrade(engine)
+    elif command == 'version':
+        with engine.begin() as conn:
+            print(current_version(conn))
+    elif command == 'check':
+        regressions = check_query_plans(engine)
+        for name, table in regressions:
+            print(f"FULL SCAN: {name} reads every row of {table}")
+        if regressions:
+            sys.exit(1)
+        print(f"All {len(HOT_QUERIES)} hot query plans use indexes")
+    else:
+        print("Usage: python migrations.py [upgrade|version|check]")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 import os
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float, ForeignKey
+from sqlalchemy import create_engine, make_url, Column, Integer, String, DateTime, Text, Float, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, backref
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -51,6 +51,11 @@ class Product(Base):
     
     distribution_center = relationship("DistributionCenter")
 
+    __table_args__ = (
+        Index('ix_products_category', 'category'),
+        Index('ix_products_brand', 'brand'),
+    )
+
 class InventoryItem(Base):
     __tablename__ = 'inventory_items'
     
@@ -69,6 +74,10 @@ class InventoryItem(Base):
     
     product = relationship("Product")
 
+    __table_args__ = (
+        Index('ix_inventory_items_product_id_sold_at', 'product_id', 'sold_at'),
+    )
+
 class Order(Base):
     __tablename__ = 'orders'
     
@@ -103,6 +112,10 @@ class OrderItem(Base):
     product = relationship("Product")
     inventory_item = relationship("InventoryItem")
 
+    __table_args__ = (
+        Index('ix_order_items_order_id', 'order_id'),
+    )
+
 # Conversation schema for chat functionality
 class Conversation(Base):
     __tablename__ = 'conversations'
@@ -115,6 +128,11 @@ class Conversation(Base):
     
     user = relationship("User", backref="conversations")
 
+    __table_args__ = (
+        Index('ix_conversations_created_at', 'created_at'),
+        Index('ix_conversations_updated_at', 'updated_at'),
+    )
+
 class Message(Base):
     __tablename__ = 'messages'
     
@@ -126,8 +144,36 @@ class Message(Base):
     
     conversation = relationship("Conversation", backref="messages")
 
+    __table_args__ = (
+        Index('ix_messages_conversation_id_timestamp', 'conversation_id', 'timestamp'),
+    )
+
+# Cold storage for conversations idle past the archive cutoff: all of their
+# messages packed into one compressed blob (see conversation_archive.py)
+class ArchivedConversation(Base):
+    __tablename__ = 'archived_conversations'
+    
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), unique=True)
+    message_count = Column(Integer)
+    last_message_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    payload = Column(LargeBinary(length=2**24))  # zlib-compressed JSON messages
+    
+    conversation = relationship("Conversation", backref=backref("archive", uselist=False))
+
+def _with_driver(database_url):
+    """Accept plain mysql:// URLs (as used in docker-compose) with our driver"""
+    if database_url.startswith('mysql://'):
+        return 'mysql+mysqlconnector://' + database_url[len('mysql://'):]
+    return database_url
+
 def get_database_url():
     """Generate database URL from environment variables"""
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        return _with_driver(database_url)
+    
     db_host = os.getenv('DB_HOST', 'localhost')
     db_user = os.getenv('DB_USER', 'root')
     db_password = os.getenv('DB_PASSWORD', 'password')
@@ -135,12 +181,32 @@ def get_database_url():
     
     return f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
 
-def create_database_engine():
+def get_replica_urls():
+    """Read replica database URLs from DB_REPLICA_URLS (comma separated)"""
+    urls = os.getenv('DB_REPLICA_URLS', '')
+    return [_with_driver(url.strip()) for url in urls.split(',') if url.strip()]
+
+def create_database_engine(database_url=None):
     """Create and return database engine"""
-    database_url = get_database_url()
-    engine = create_engine(database_url, echo=True)
+    database_url = database_url or get_database_url()
+    echo = os.getenv('SQLALCHEMY_ECHO', 'True').lower() == 'true'
+    engine = create_engine(database_url, echo=echo, **pool_options(database_url))
     return engine
 
+def pool_options(database_url):
+    """Size the connection pool for the gunicorn threads sharing it"""
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite uses a per-thread pool that takes no size settings
+        return {}
+    # A chat request holds two primary connections when no replica is
+    # configured (its write session and its read session)
+    threads = int(os.getenv('GUNICORN_THREADS', 16))
+    return {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', threads)),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', threads))
+    }
+
 def create_tables(engine):
     """Create all tables in the database"""
     Base.metadata.create_all(engine)
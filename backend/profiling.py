@@ -0,0 +1,190 @@
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+PROFILE_ID_RE = re.compile(r'^[0-9TZ]+-[0-9a-f]{8}$')
+
+def frame_label(frame):
+    """Flame graph label for a frame: function (file:first line)"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread
+
+    Only frames below the point where start() was called are kept, so every
+    stack is rooted at the profiled code instead of the WSGI server.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling the calling thread"""
+        self._thread_id = threading.get_ident()
+        # Keep the outer frames referenced so their ids can't be reused
+        self._outer_frames = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            self._outer_frames.append(frame)
+            frame = frame.f_back
+        self._outer_ids = {id(frame) for frame in self._outer_frames}
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the elapsed wall time in seconds"""
+        self._stop.set()
+        self._thread.join()
+        self._outer_frames = []
+        return time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None and id(frame) not in self._outer_ids:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        """Stacks in collapsed format, one "frame;frame;frame count" per line"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class ProfileStore:
+    """Decides which requests to profile and keeps their output on local disk
+
+    A request is profiled when it carries the PROFILE_TOKEN in X-Profile-Token
+    or is picked by PROFILE_SAMPLE_RATE. Output is written as collapsed stacks
+    (flamegraph.pl, speedscope) next to a JSON metadata file.
+    """
+
+    def __init__(self, directory, token=None, sample_rate=0.0, interval=0.005, keep=50, max_concurrent=2):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.keep = keep
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self._active = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build the store from PROFILE_* settings"""
+        return cls(
+            os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')),
+            token=os.getenv('PROFILE_TOKEN') or None,
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+            interval=float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000,
+            keep=max(1, int(os.getenv('PROFILE_KEEP', 50))),
+            max_concurrent=int(os.getenv('PROFILE_MAX_CONCURRENT', 2))
+        )
+
+    def authorized(self, headers):
+        """Check the privileged profiling token on a request"""
+        supplied = headers.get('X-Profile-Token')
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def start(self, headers):
+        """Start profiling the current request if it opted in; returns (profiler, trigger) or None"""
+        if self.authorized(headers):
+            trigger = 'header'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sampled'
+        else:
+            return None
+
+        with self._lock:
+            # Bound the sampling overhead under load
+            if self._active >= self.max_concurrent:
+                self.skipped += 1
+                return None
+            self._active += 1
+
+        profiler = SamplingProfiler(self.interval)
+        try:
+            profiler.start()
+        except Exception:
+            with self._lock:
+                self._active -= 1
+            raise
+        return profiler, trigger
+
+    def finish(self, profile, **metadata):
+        """Stop a profile, write it to disk and return its id"""
+        profiler, trigger = profile
+        try:
+            elapsed = profiler.stop()
+        finally:
+            with self._lock:
+                self._active -= 1
+
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:8]}"
+        metadata.update(
+            id=profile_id,
+            created_at=datetime.utcnow().isoformat(),
+            trigger=trigger,
+            duration_ms=round(elapsed * 1000, 2),
+            samples=profiler.samples,
+            interval_ms=self.interval * 1000
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, 'folded'), 'w') as output:
+            output.write(profiler.folded())
+        with open(self._path(profile_id, 'json'), 'w') as output:
+            json.dump(metadata, output)
+        self._prune()
+        return profile_id
+
+    def recent(self):
+        """Metadata of stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, name)) as metadata:
+                        profiles.append(json.load(metadata))
+                except (OSError, ValueError):
+                    # Pruned or half-written by another worker
+                    continue
+        return profiles
+
+    def folded_path(self, profile_id):
+        """Path of a stored profile's collapsed stacks, or None"""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = self._path(profile_id, 'folded')
+        return path if os.path.exists(path) else None
+
+    def _path(self, profile_id, extension):
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def _prune(self):
+        """Delete the oldest profiles beyond the retention count"""
+        ids = sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
+        for profile_id in ids[:-self.keep]:
+            for extension in ('folded', 'json'):
+                try:
+                    os.remove(self._path(profile_id, extension))
+                except OSError:
+                    pass
@@ -0,0 +1,104 @@
+from sqlalchemy import select, func, desc
+from models import (
+    Product, InventoryItem, Order, OrderItem,
+    Conversation, Message, ArchivedConversation
+)
+
+# Statements for the hot request paths. The chat handlers and endpoints
+# execute these builders, and `migrations.py check` EXPLAINs the very same
+# builders, so a query change here is plan-checked automatically.
+
+def top_products(limit=5):
+    """Best-selling products by number of sold inventory items"""
+    return select(
+        Product.name,
+        Product.brand,
+        Product.category,
+        Product.retail_price,
+        func.count(InventoryItem.id).label('sold_count')
+    ).join(
+        InventoryItem, Product.id == InventoryItem.product_id
+    ).filter(
+        InventoryItem.sold_at.isnot(None)
+    ).group_by(
+        Product.id, Product.name, Product.brand, Product.category, Product.retail_price
+    ).order_by(
+        desc('sold_count')
+    ).limit(limit)
+
+def products_by_ids(product_ids):
+    """Products already resolved against the catalog"""
+    return select(Product).filter(Product.id.in_(product_ids))
+
+def products_matching_name(product_name):
+    """Products whose name contains the given text (case-insensitive)"""
+    return select(Product).filter(Product.name.ilike(f'%{product_name}%'))
+
+def available_stock_by_center(product_id):
+    """Unsold inventory of a product per shipping distribution center"""
+    return select(
+        InventoryItem.product_distribution_center_id, func.count(InventoryItem.id)
+    ).filter(
+        InventoryItem.product_id == product_id,
+        InventoryItem.sold_at.is_(None)
+    ).group_by(InventoryItem.product_distribution_center_id)
+
+def product_count():
+    """Number of products in the catalog"""
+    return select(func.count(Product.id))
+
+def catalog_categories(limit=10):
+    """A sample of distinct product categories"""
+    return select(Product.category).distinct().limit(limit)
+
+def catalog_brands(limit=10):
+    """A sample of distinct product brands"""
+    return select(Product.brand).distinct().limit(limit)
+
+def order_by_id(order_id):
+    """An order by its order id"""
+    return select(Order).filter(Order.order_id == order_id)
+
+def order_items(order_id):
+    """Items of an order together with their products"""
+    return select(OrderItem, Product).join(Product, OrderItem.product_id == Product.id).filter(
+        OrderItem.order_id == order_id
+    )
+
+def conversation_by_session(session_id):
+    """A conversation by its public session id"""
+    return select(Conversation).filter(Conversation.session_id == session_id)
+
+def conversation_version(conversation_id):
+    """Count, newest id and newest timestamp of a conversation's hot messages"""
+    return select(
+        func.count(Message.id), func.max(Message.id), func.max(Message.timestamp)
+    ).filter(Message.conversation_id == conversation_id)
+
+def conversation_messages(conversation_id, since=None):
+    """Hot messages of a conversation, oldest first, optionally only newer than since"""
+    statement = select(Message).filter(Message.conversation_id == conversation_id)
+    if since is not None:
+        statement = statement.filter(Message.timestamp > since)
+    return statement.order_by(Message.timestamp)
+
+def conversation_list_version():
+    """Count and latest update of all conversations"""
+    return select(func.count(Conversation.id), func.max(Conversation.updated_at))
+
+def conversation_list(since=None, limit=50):
+    """Newest conversations, optionally only those updated after since"""
+    statement = select(Conversation)
+    if since is not None:
+        statement = statement.filter(Conversation.updated_at > since)
+    return statement.order_by(Conversation.created_at.desc()).limit(limit)
+
+def message_counts(conversation_ids):
+    """Hot message count per conversation"""
+    return select(Message.conversation_id, func.count(Message.id)).filter(
+        Message.conversation_id.in_(conversation_ids)
+    ).group_by(Message.conversation_id)
+
+def conversation_archive(conversation_id):
+    """The cold-storage archive row of a conversation"""
+    return select(ArchivedConversation).filter(ArchivedConversation.conversation_id == conversation_id)
@@ -0,0 +1,150 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from traffic_capture import read_capture
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def post_chat(base_url, message, conversation_id, client, timeout):
+    """POST one message to /api/chat and return (status, body)"""
+    payload = {"message": message}
+    if conversation_id:
+        payload["conversation_id"] = conversation_id
+    request = urllib.request.Request(
+        f"{base_url.rstrip('/')}/api/chat",
+        data=json.dumps(payload).encode('utf-8'),
+        headers={"Content-Type": "application/json", "X-Forwarded-For": client or "replay"},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        return e.code, {}
+
+class Replay:
+    """Re-sends captured /api/chat traffic, preserving arrival times and conversation order"""
+
+    def __init__(self, base_url, records, speed=1.0, max_workers=64, timeout=60.0):
+        self.base_url = base_url
+        self.records = records
+        self.speed = speed
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conversations = {}   # recorded pseudonym -> conversation id on this server
+        self._previous = {}        # recorded pseudonym -> future of its latest request
+        self.results = []
+
+    def run(self):
+        """Replay every record and return the wall-clock duration in seconds"""
+        if not self.records:
+            return 0.0
+        first_ts = self.records[0]['ts']
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for record in self.records:
+                delay = started + (record['ts'] - first_ts) / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                conversation = record.get('conv')
+                # Follow-ups wait for the earlier turn of their conversation,
+                # which was submitted first and so is already running
+                previous = self._previous.get(conversation) if conversation else None
+                future = pool.submit(self._send, record, previous)
+                if conversation:
+                    self._previous[conversation] = future
+        return time.monotonic() - started
+
+    def _send(self, record, previous):
+        if previous is not None:
+            previous.exception()
+        conversation = record.get('conv')
+        with self._lock:
+            conversation_id = None if record.get('new') else self._conversations.get(conversation)
+
+        sent = time.perf_counter()
+        try:
+            status, body = post_chat(self.base_url, record.get('msg') or '', conversation_id,
+                                     record.get('client'), self.timeout)
+        except Exception as e:
+            status, body = None, {}
+        elapsed_ms = (time.perf_counter() - sent) * 1000
+
+        if conversation and body.get('conversation_id'):
+            with self._lock:
+                self._conversations[conversation] = body['conversation_id']
+        with self._lock:
+            self.results.append((record, status, elapsed_ms))
+
+def summarize(results, duration):
+    """Latency percentiles, error rate and throughput per recorded intent"""
+    groups = defaultdict(list)
+    for record, status, elapsed_ms in results:
+        groups[record.get('intent') or ('degraded' if record.get('degraded') else 'none')].append(
+            (status, elapsed_ms, record.get('ms'))
+        )
+    groups['ALL'] = [item for key in list(groups) for item in groups[key]]
+
+    summary = {}
+    for intent, items in groups.items():
+        latencies = sorted(elapsed_ms for _, elapsed_ms, _ in items)
+        recorded = sorted(ms for _, _, ms in items if ms is not None)
+        errors = sum(1 for status, _, _ in items if status is None or status >= 500)
+        summary[intent] = {
+            "requests": len(items),
+            "errors": errors,
+            "error_rate": errors / len(items),
+            "shed": sum(1 for status, _, _ in items if status == 503),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "recorded_p95_ms": percentile(recorded, 0.95),
+            "rps": len(items) / duration if duration else 0.0
+        }
+    return summary
+
+def print_report(summary, duration, speed):
+    print(f"Replayed {summary.get('ALL', {}).get('requests', 0)} requests at {speed:g}x in {duration:.1f}s")
+    print(f"{'intent':<18}{'reqs':>7}{'err%':>7}{'shed':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'rec p95':>9}{'rps':>8}")
+    for intent in sorted(summary, key=lambda name: (name == 'ALL', name)):
+        row = summary[intent]
+        print(f"{intent:<18}{row['requests']:>7}{row['error_rate'] * 100:>6.1f}%{row['shed']:>6}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+              f"{row['recorded_p95_ms']:>9.1f}{row['rps']:>8.2f}")
+
+def main():
+    """Replay a traffic capture against a local server and report per-intent latency"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('capture', help='capture log written with TRAFFIC_CAPTURE_PATH (.jsonl or .jsonl.gz)')
+    parser.add_argument('--url', default='http://localhost:5001', help='server to replay against')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay at N times the recorded rate')
+    parser.add_argument('--workers', type=int, default=64, help='maximum concurrent requests')
+    parser.add_argument('--limit', type=int, help='replay only the first N records')
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args()
+
+    records = read_capture(args.capture)
+    if args.limit:
+        records = records[:args.limit]
+
+    replay = Replay(args.url, records, speed=args.speed, max_workers=args.workers)
+    duration = replay.run()
+    summary = summarize(replay.results, duration)
+    print_report(summary, duration, args.speed)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(summary, output, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import threading
+import time
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and receive the same result (or exception). Results are not
+    cached once the call completes.
+    """
+
+    def __init__(self, wait_timeout=30.0):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self._executed = 0
+        self._shared = 0
+        self._wait_timeouts = 0
+        self._total_wait = 0.0
+
+    def do(self, key, fn):
+        """Run fn() for key, or wait for the identical call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+
+        if not leader:
+            started = time.monotonic()
+            finished = call.done.wait(self.wait_timeout)
+            with self._lock:
+                self._total_wait += time.monotonic() - started
+                if finished:
+                    self._shared += 1
+                else:
+                    # Don't hang behind a stuck leader; run the call ourselves
+                    self._wait_timeouts += 1
+                    self._executed += 1
+            if not finished:
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """Counters for the metrics endpoint"""
+        with self._lock:
+            calls = self._executed + self._shared
+            waits = self._shared + self._wait_timeouts
+            return {
+                "calls": calls,
+                "executed": self._executed,
+                "shared": self._shared,
+                "dedup_rate": round(self._shared / calls, 4) if calls else 0.0,
+                "in_flight": len(self._calls),
+                "wait_timeouts": self._wait_timeouts,
+                "avg_wait_ms": round(self._total_wait / waits * 1000, 2) if waits else 0.0
+            }
@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from flask import g, request
+
+# Personal data that must not reach the capture log. Short numbers such as
+# order IDs are kept so replayed order lookups exercise the same code path.
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+PHONE_RE = re.compile(r'\+?\d[\d\s().-]{7,}\d')
+
+def scrub(text):
+    """Mask emails and phone/card-like digit runs in free text"""
+    if not isinstance(text, str):
+        return text
+    return PHONE_RE.sub('<number>', EMAIL_RE.sub('<email>', text))
+
+def scrub_intent(intent_analysis):
+    """Copy an intent analysis with its string entities scrubbed"""
+    entities = intent_analysis.get('entities') or {}
+    return dict(intent_analysis, entities={key: scrub(value) for key, value in entities.items()})
+
+class TrafficRecorder:
+    """Appends anonymized /api/chat request/response pairs to a JSON-lines log
+
+    Each worker appends whole lines with a single O_APPEND write, so gunicorn
+    workers can share one file. Conversation and client IDs are replaced by a
+    keyed hash: follow-ups stay linked within a capture but can't be traced
+    back to real sessions.
+    """
+
+    def __init__(self, path, sample_rate=1.0, salt=None, endpoints=('chat',)):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.salt = salt or os.urandom(16)
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self.recorded = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a recorder from TRAFFIC_CAPTURE_* settings, or None when capture is off"""
+        path = os.getenv('TRAFFIC_CAPTURE_PATH')
+        if not path:
+            return None
+        salt = os.getenv('TRAFFIC_CAPTURE_SALT')
+        return cls(
+            path,
+            sample_rate=float(os.getenv('TRAFFIC_CAPTURE_SAMPLE_RATE', 1.0)),
+            salt=salt.encode('utf-8') if salt else None
+        )
+
+    def init_app(self, app):
+        """Time captured endpoints and record them after each response"""
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def pseudonym(self, value):
+        """Stable, unlinkable stand-in for an identifier"""
+        if not value:
+            return None
+        return hmac.new(self.salt, str(value).encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    def _sampled(self, conversation):
+        # Sample whole conversations so replayed follow-ups keep their context
+        if self.sample_rate >= 1:
+            return True
+        return int(conversation[:8], 16) / 0xFFFFFFFF < self.sample_rate
+
+    def _start(self):
+        if request.endpoint in self.endpoints:
+            g.traffic_started = time.perf_counter()
+            g.traffic_trace = {}
+
+    def _finish(self, response):
+        started = g.pop('traffic_started', None)
+        if started is None:
+            return response
+        try:
+            self._record(response, (time.perf_counter() - started) * 1000, g.pop('traffic_trace', {}))
+        except Exception as e:
+            # Capture must never fail the request it observes
+            pass
+        return response
+
+    def _record(self, response, elapsed_ms, trace):
+        payload = request.get_json(silent=True) or {}
+        body = response.get_json(silent=True) if response.is_json else None
+        body = body or {}
+        conversation_id = payload.get('conversation_id') or body.get('conversation_id')
+        conversation = self.pseudonym(conversation_id)
+        if conversation and not self._sampled(conversation):
+            return
+
+        answer = body.get('response') or ''
+        intent_analysis = trace.get('intent_analysis')
+        entry = {
+            "ts": round(time.time() - elapsed_ms / 1000, 3),
+            "conv": conversation,
+            "new": not payload.get('conversation_id'),
+            "client": self.pseudonym(request.remote_addr),
+            "msg": scrub(payload.get('message')),
+            "status": response.status_code,
+            "ms": round(elapsed_ms, 2),
+            "intent": intent_analysis.get('intent') if intent_analysis else None,
+            "analysis": scrub_intent(intent_analysis) if intent_analysis else None,
+            "source": trace.get('classified_by'),
+            "classify_ms": trace.get('classify_ms'),
+            "degraded": trace.get('degraded', False),
+            "resp_len": len(answer),
+            "resp_sha1": hashlib.sha1(answer.encode('utf-8')).hexdigest()[:12] if answer else None
+        }
+        self.write(entry)
+
+    def write(self, entry):
+        """Append one record as a single line"""
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            if self._pid != os.getpid():
+                # Reopen after a fork so each worker has its own descriptor
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                self._pid = os.getpid()
+            os.write(self._fd, line)
+            self.recorded += 1
+
+def read_capture(path):
+    """Yield the records of a capture log (optionally gzipped), oldest first"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as capture:
+        records = [json.loads(line) for line in capture if line.strip()]
+    records.sort(key=lambda record: record['ts'])
+    return records
+
+def load_recorded_classifications(path):
+    """Map normalized message to (recorded LLM classification, LLM latency in ms)"""
+    from chat_service import normalize_message
+    classifications = {}
+    cached = {}
+    latencies = []
+    for record in read_capture(path):
+        if not record.get('analysis') or not record.get('msg'):
+            continue
+        key = normalize_message(record['msg'])
+        if record.get('source') == 'llm':
+            latency = record.get('classify_ms') or 0
+            classifications[key] = (record['analysis'], latency)
+            latencies.append(latency)
+        elif record.get('source') == 'cache':
+            cached.setdefault(key, record['analysis'])
+
+    # Messages only seen as cache hits still cost an LLM call on a cold replay
+    # server; charge them the average recorded LLM latency
+    average = sum(latencies) / len(latencies) if latencies else 0
+    for key, analysis in cached.items():
+        classifications.setdefault(key, (analysis, average))
+    return classifications
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useChat } from '../context/ChatContext';
 import { chatAPI, handleAPIError, convertAPIMessageToMessage } from '../services/api';
 import { MessageSquare, Plus } from 'lucide-react';
@@ -16,6 +16,8 @@ export const ConversationHistory: React.FC = () => {
   const [conversationSummaries, setConversationSummaries] = useState<ConversationSummary[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Newest updated_at seen so far; later refreshes only fetch what changed
+  const lastSyncRef = useRef<string | undefined>(undefined);
 
   useEffect(() => {
     loadConversations();
@@ -29,11 +31,28 @@ export const ConversationHistory: React.FC = () => {
   }, [state.refreshTrigger]);
 
   const loadConversations = async () => {
-    setIsLoading(true);
+    const since = lastSyncRef.current;
+    // Only show the spinner for the first full load, not for delta refreshes
+    if (!since) {
+      setIsLoading(true);
+    }
     setError(null);
     try {
-      const response = await chatAPI.getAllConversations();
-      setConversationSummaries(response.conversations);
+      const response = await chatAPI.getAllConversations(since);
+      const changed = response.conversations;
+      setConversationSummaries(previous => {
+        if (!response.delta) {
+          return changed;
+        }
+        const changedIds = new Set(changed.map(conv => conv.conversation_id));
+        return [...changed, ...previous.filter(conv => !changedIds.has(conv.conversation_id))]
+          .sort((a, b) => b.created_at.localeCompare(a.created_at));
+      });
+      changed.forEach(conv => {
+        if (!lastSyncRef.current || conv.updated_at > lastSyncRef.current) {
+          lastSyncRef.current = conv.updated_at;
+        }
+      });
     } catch (err) {
       setError(handleAPIError(err));
     } finally {
@@ -43,16 +62,22 @@ export const ConversationHistory: React.FC = () => {
 
   const loadConversationHistory = async (conversationId: string) => {
     try {
-      const response = await chatAPI.getConversationHistory(conversationId);
+      // Ask only for messages newer than the ones already held for this conversation
+      const known = state.conversations.find(c => c.id === conversationId)?.messages || [];
+      const since = known.length > 0 ? known[known.length - 1].timestamp : undefined;
+      const response = await chatAPI.getConversationHistory(conversationId, since);
       
       // Convert API messages to internal format
+      const offset = response.delta ? known.length : 0;
       const messages = response.messages.map((msg, index) => 
-        convertAPIMessageToMessage(msg, index)
+        convertAPIMessageToMessage(msg, index, offset)
       );
 
-      // Set the messages and current conversation
-      dispatch({ type: 'SET_MESSAGES', payload: messages });
-      dispatch({ type: 'SET_CURRENT_CONVERSATION', payload: conversationId });
+      // Store the messages and make this the current conversation
+      dispatch({
+        type: 'SYNC_CONVERSATION',
+        payload: { id: conversationId, messages, delta: !!response.delta }
+      });
       
     } catch (err) {
       setError(handleAPIError(err));
@@ -53,6 +53,16 @@ export const UserInput: React.FC = () => {
         timestamp: response.timestamp,
       };
 
+      // Degraded answers (server under load) aren't saved, so keep them and
+      // the question out of the stored conversation history
+      if (response.degraded || !response.conversation_id) {
+        dispatch({
+          type: 'SET_MESSAGES',
+          payload: [...state.messages, { ...userMessage, degraded: true }, { ...aiMessage, degraded: true }]
+        });
+        return;
+      }
+
       dispatch({ type: 'ADD_MESSAGE', payload: aiMessage });
 
       // Update current conversation ID if it's a new conversation
@@ -61,7 +71,7 @@ export const UserInput: React.FC = () => {
       }
 
       // Update conversation in the list
-      const updatedMessages = [...state.messages, userMessage, aiMessage];
+      const updatedMessages = [...state.messages.filter(m => !m.degraded), userMessage, aiMessage];
       dispatch({ 
         type: 'UPDATE_CONVERSATION', 
         payload: { 
@@ -6,6 +6,8 @@ export interface Message {
   type: 'user' | 'assistant';
   content: string;
   timestamp: string;
+  // Shown in the chat but never saved by the server (load shedding)
+  degraded?: boolean;
 }
 
 export interface Conversation {
@@ -35,6 +37,7 @@ export type ChatAction =
   | { type: 'SET_CURRENT_CONVERSATION'; payload: string | null }
   | { type: 'ADD_CONVERSATION'; payload: Conversation }
   | { type: 'UPDATE_CONVERSATION'; payload: { id: string; messages: Message[] } }
+  | { type: 'SYNC_CONVERSATION'; payload: { id: string; messages: Message[]; delta: boolean } }
   | { type: 'SET_ERROR'; payload: string | null }
   | { type: 'CLEAR_MESSAGES' }
   | { type: 'TRIGGER_REFRESH' };
@@ -93,6 +96,25 @@ function chatReducer(state: ChatState, action: ChatAction): ChatState {
         )
       };
     
+    case 'SYNC_CONVERSATION': {
+      // Store a fetched history, appending when the server sent only a delta
+      const { id, messages, delta } = action.payload;
+      const existing = state.conversations.find(conv => conv.id === id);
+      const merged = delta && existing ? [...existing.messages, ...messages] : messages;
+      const now = new Date().toISOString();
+      const conversations = existing
+        ? state.conversations.map(conv =>
+            conv.id === id ? { ...conv, messages: merged, updatedAt: now } : conv
+          )
+        : [...state.conversations, { id, messages: merged, createdAt: merged[0]?.timestamp || now, updatedAt: now }];
+      return {
+        ...state,
+        conversations,
+        messages: merged,
+        currentConversationId: id
+      };
+    }
+    
     case 'SET_ERROR':
       return { ...state, error: action.payload };
     
@@ -10,10 +10,53 @@ const apiClient = axios.create({
   },
 });
 
+// Server timestamp of our latest chat write. Sent with conversation reads so
+// whichever backend worker serves them reads from the primary until replicas
+// have caught up (read-your-writes).
+let lastWriteAt: string | undefined;
+
+// Last validated response per URL, replayed when the server answers 304.
+// Every distinct `since` is its own URL, so keep only the most recent few.
+const ETAG_CACHE_SIZE = 50;
+const etagCache = new Map<string, { etag: string; data: any }>();
+
+// GET with If-None-Match revalidation against the cached copy of the same URL
+const getWithETag = async <T>(url: string, params?: Record<string, string>): Promise<T> => {
+  const cacheKey = params ? `${url}?${new URLSearchParams(params).toString()}` : url;
+  const cached = etagCache.get(cacheKey);
+  const headers: Record<string, string> = {};
+  if (cached) {
+    headers['If-None-Match'] = cached.etag;
+  }
+  if (lastWriteAt) {
+    headers['X-Last-Write'] = lastWriteAt;
+  }
+  const response = await apiClient.get(url, {
+    params,
+    headers,
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.status === 304 && cached) {
+    return cached.data;
+  }
+  const etag = response.headers['etag'];
+  if (etag) {
+    etagCache.delete(cacheKey);
+    etagCache.set(cacheKey, { etag, data: response.data });
+    if (etagCache.size > ETAG_CACHE_SIZE) {
+      // Maps iterate in insertion order, so the first key is the oldest
+      etagCache.delete(etagCache.keys().next().value as string);
+    }
+  }
+  return response.data;
+};
+
 export interface ChatResponse {
   response: string;
-  conversation_id: string;
+  // null when a new conversation got a degraded answer, which isn't saved
+  conversation_id: string | null;
   timestamp: string;
+  degraded?: boolean;
 }
 
 export interface ConversationHistoryResponse {
@@ -23,6 +66,14 @@ export interface ConversationHistoryResponse {
     content: string;
     timestamp: string;
   }>;
+  delta?: boolean;
+}
+
+export interface ConversationSummaryResponse {
+  conversation_id: string;
+  created_at: string;
+  updated_at: string;
+  message_count: number;
 }
 
 export const chatAPI = {
@@ -32,24 +83,23 @@ export const chatAPI = {
       message,
       conversation_id: conversationId,
     });
+    if (!response.data.degraded) {
+      lastWriteAt = response.data.timestamp;
+    }
     return response.data;
   },
 
-  // Get conversation history
-  getConversationHistory: async (conversationId: string): Promise<ConversationHistoryResponse> => {
-    const response = await apiClient.get(`/api/conversations/${conversationId}/history`);
-    return response.data;
+  // Get conversation history, or only messages newer than `since`
+  getConversationHistory: async (conversationId: string, since?: string): Promise<ConversationHistoryResponse> => {
+    return getWithETag(`/api/conversations/${conversationId}/history`, since ? { since } : undefined);
   },
 
-  // Get all conversations
-  getAllConversations: async (): Promise<{ conversations: Array<{
-    conversation_id: string;
-    created_at: string;
-    updated_at: string;
-    message_count: number;
-  }> }> => {
-    const response = await apiClient.get('/api/conversations');
-    return response.data;
+  // Get all conversations, or only those updated after `since`
+  getAllConversations: async (since?: string): Promise<{
+    conversations: ConversationSummaryResponse[];
+    delta?: boolean;
+  }> => {
+    return getWithETag('/api/conversations', since ? { since } : undefined);
   },
 
   // Health check
@@ -62,9 +112,10 @@ export const chatAPI = {
 // Utility function to convert API message format to internal format
 export const convertAPIMessageToMessage = (
   apiMessage: { type: 'user' | 'assistant'; content: string; timestamp: string },
-  index: number
+  index: number,
+  offset: number = 0
 ): Message => ({
-  id: `msg-${Date.now()}-${index}`,
+  id: `msg-${Date.now()}-${offset + index}`,
   type: apiMessage.type,
   content: apiMessage.content,
   timestamp: apiMessage.timestamp,